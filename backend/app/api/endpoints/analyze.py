@@ -1,114 +1,203 @@
-from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request
-from app.models.schemas import AnalyzeResponse, AnalyzeRequest
-from app.services.gemini_service import analyze_multimodal
-from app.services.redis_service import redis_service
-from app.services.rag_service import rag_service
-from app.core.security import limiter
-import hashlib
-import tempfile
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict, List
+from app.models.schemas import (
+    AnalyzeResponse, AnalyzeRequest, MultiAnalyzeResponse, PreflightRequest, PreflightResponse,
+)
+from app.services.analysis_service import analyze_media, get_cached_results
+from app.services.text_analysis_service import analyze_transcript
+from app.services.upload_service import declared_sha256, multipart_openapi, stream_upload
+from app.core.config import settings
+from app.core.metrics import current_platform, set_request_labels
+from app.core.security import create_upload_token, limiter, verify_upload_token
 import os
-import json
 import logging
+import re
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
-@router.post("/analyze", response_model=AnalyzeResponse)
+def parse_platforms(values: List[str]) -> List[str]:
+    """Accepts repeated form fields and/or comma-separated values, de-duplicated in order."""
+    platforms = []
+    for value in values:
+        for platform in value.split(","):
+            platform = platform.strip()
+            if platform and platform not in platforms:
+                platforms.append(platform)
+    return platforms
+
+FILE_PROPERTY = {"type": "string", "format": "binary"}
+SHA256_PROPERTY = {
+    "type": "string",
+    "description": "Optional hex SHA-256 of the file. Sent before the file, a cached verdict is returned without reading the upload.",
+}
+
+def cache_check(platforms_from_fields, hits: Dict[str, AnalyzeResponse]):
+    """Builds an on_file_start hook that answers from the cache when every platform is cached."""
+    async def check(fields: Dict[str, List[str]]) -> bool:
+        platforms = platforms_from_fields(fields)
+        file_hash = declared_sha256(fields)
+        if not platforms or not file_hash:
+            return False
+        hits.update(await get_cached_results(platforms, file_hash))
+        return all(platform in hits for platform in platforms)
+    return check
+
+SHA256_PATTERN = re.compile(r"^[0-9a-fA-F]{64}$")
+
+def platform_field(fields: Dict[str, List[str]]) -> List[str]:
+    return (fields.get("platform") or [])[:1]
+
+def platforms_field(fields: Dict[str, List[str]]) -> List[str]:
+    return parse_platforms(fields.get("platforms") or [])
+
+@router.post("/analyze/preflight", response_model=PreflightResponse)
+@limiter.limit("30/minute")
+async def analyze_preflight(request: Request, body: PreflightRequest):
+    """
+    Checks for a cached verdict before the client uploads anything.
+
+    Returns the cached result, or an upload token bound to (platform, sha256, size)
+    to send with the /analyze upload, which is hashed and checked against it.
+    """
+    if not SHA256_PATTERN.match(body.sha256):
+        raise HTTPException(status_code=422, detail="sha256 must be 64 hex characters")
+    if settings.MAX_UPLOAD_BYTES and body.size > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {settings.MAX_UPLOAD_BYTES} byte limit")
+
+    sha256 = body.sha256.lower()
+    set_request_labels(platform=body.platform)
+    try:
+        hits = await get_cached_results([body.platform], sha256)
+    except Exception as e:
+        logger.error(f"Preflight cache check failed: {e}")
+        hits = {}
+    if body.platform in hits:
+        set_request_labels(cache_hit=True)
+        return PreflightResponse(status="cached", result=hits[body.platform])
+
+    token, expires_at = create_upload_token(body.platform, sha256, body.size)
+    return PreflightResponse(status="upload_required", upload_token=token, expires_at=expires_at)
+
+@router.post(
+    "/analyze",
+    response_model=AnalyzeResponse,
+    openapi_extra=multipart_openapi(
+        {
+            "platform": {"type": "string"},
+            "sha256": SHA256_PROPERTY,
+            "upload_token": {"type": "string", "description": "Token from /analyze/preflight, if one was issued."},
+            "file": FILE_PROPERTY,
+        },
+        ["platform", "file"],
+    ),
+)
 @limiter.limit("5/minute")
-async def analyze_content(
-    request: Request,
-    file: UploadFile = File(...),
-    platform: str = Form(...)
-):
+async def analyze_content(request: Request):
     """
     Analyzes video content for policy violations using Gemini 1.5 Flash.
     """
+    hits: Dict[str, AnalyzeResponse] = {}
+    upload = None
     try:
-        # Create a temp file for the video and generate hash without loading full file into memory
-        suffix = os.path.splitext(file.filename or "")[1] or ".mp4"
-        sha256_hash = hashlib.sha256()
-        
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            while chunk := await file.read(8192):
-                sha256_hash.update(chunk)
-                tmp.write(chunk)
-            tmp_path = tmp.name
-
-        file_hash = sha256_hash.hexdigest()
-        cache_key = f"analyze:{platform}:{file_hash}"
-        
-        # Check cache
-        cached_result = redis_service.get_cached_analysis(cache_key)
-        if cached_result:
-            if os.path.exists(tmp_path):
-                os.remove(tmp_path)
-            return AnalyzeResponse(**cached_result)
-
-        # Retrieve relevant policy documents using RAG
-        logger.info(f"Retrieving policies for platform: {platform}")
-        policy_context = rag_service.query(platform, "What are the core community guidelines and safety policies?")
-        
-        # Construct Prompt with RAG Context
-        prompt = f"""
-        You are a content compliance expert for {platform}.
-        Analyze this video for policy violations based on the following specific policy context:
-
-        --- RELEVANT POLICY CONTEXT ---
-        {policy_context}
-        --- END OF CONTEXT ---
-        
-        CRITICAL INSTRUCTION: You MUST analyze both the AUDIO (transcript) and the VISUALS (frames).
-        Look specifically for:
-        - Weapons (guns, knives)
-        - Drugs or paraphernalia
-        - Violence or physical altercations
-        - Text on screen that violates policy
-        
-        Output the result in strict JSON format with this structure:
-        {{
-            "platform": "{platform}",
-            "risk_level": "Low" | "Medium" | "High",
-            "summary_rationale": "A brief 2-sentence summary of why this risk level was assigned.",
-            "issues": [
-                {{
-                    "category": "Category Name (e.g. Violence, Hate Speech, Dangerous Goods)",
-                    "timestamp": "MM:SS (e.g. 01:23) or 'Entire Video'",
-                    "snippet": "Visual description of the event OR text transcript",
-                    "rationale": "Why this violates policy"
-                }}
-            ]
-        }}
-        """
-
-        # Call Gemini Service
-        json_response_text = analyze_multimodal(prompt, file_path=tmp_path)
-        
-        # Clean up temp file
-        os.remove(tmp_path)
-
-        # Parse JSON
-        # Clean potential markdown backticks
-        cleaned_text = json_response_text.strip()
-        if cleaned_text.startswith("```json"):
-            cleaned_text = cleaned_text[7:]
-        if cleaned_text.startswith("```"):
-            cleaned_text = cleaned_text[3:]
-        if cleaned_text.endswith("```"):
-            cleaned_text = cleaned_text[:-3]
-        
-        result_dict = json.loads(cleaned_text.strip())
-        
-        # Validate with Pydantic
-        response_model = AnalyzeResponse(**result_dict)
-        
-        # Cache the result (as dict)
-        redis_service.set_cached_analysis(cache_key, result_dict)
-        
-        return response_model
+        upload = await stream_upload(request, on_file_start=cache_check(platform_field, hits))
+        platform = upload.field("platform")
+        if not platform:
+            raise HTTPException(status_code=422, detail="Missing form field 'platform'")
+        set_request_labels(platform=platform)
+        current_platform.set(platform)
+        if upload.path is None:
+            set_request_labels(cache_hit=True)
+            return hits[platform]
+        token = upload.field("upload_token")
+        if token and not verify_upload_token(token, platform, upload.sha256, upload.size):
+            raise HTTPException(status_code=403, detail="Upload does not match its preflight token, or the token expired")
 
+        result = (await analyze_media([platform], upload.path, upload.sha256))[platform]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Analysis failed: {e}")
-        # Clean up temp file component in case of error
-        if 'tmp_path' in locals() and os.path.exists(tmp_path):
-            os.remove(tmp_path)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Clean up temp file
+        if upload and upload.path and os.path.exists(upload.path):
+            os.remove(upload.path)
+
+@router.post("/analyze/text", response_model=AnalyzeResponse)
+@limiter.limit("30/minute")
+async def analyze_text(request: Request, body: AnalyzeRequest):
+    """
+    Analyzes a transcript (captions, script) without uploading media.
+
+    Concurrent transcripts for the same platform are batched into one Gemini
+    call; results are cached by transcript hash.
+    """
+    transcript = (body.transcript or "").strip()
+    if not transcript:
+        raise HTTPException(status_code=422, detail="transcript is required")
+    if len(transcript) > settings.TEXT_MAX_CHARS:
+        raise HTTPException(status_code=413, detail=f"transcript exceeds {settings.TEXT_MAX_CHARS} characters")
+
+    set_request_labels(platform=body.platform)
+    try:
+        return await analyze_transcript(body.platform, transcript)
+    except Exception as e:
+        logger.error(f"Text analysis failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post(
+    "/analyze/multi",
+    response_model=MultiAnalyzeResponse,
+    openapi_extra=multipart_openapi(
+        {
+            "platforms": {"type": "array", "items": {"type": "string"}},
+            "sha256": SHA256_PROPERTY,
+            "file": FILE_PROPERTY,
+        },
+        ["platforms", "file"],
+    ),
+)
+@limiter.limit("5/minute")
+async def analyze_content_multi(request: Request):
+    """
+    Analyzes one upload against several platforms' policies.
+
+    The file is read, hashed and sent to Gemini once; per-platform verdicts are
+    generated concurrently and each is cached under its usual per-platform key.
+    """
+    hits: Dict[str, AnalyzeResponse] = {}
+    upload = None
+    try:
+        upload = await stream_upload(request, on_file_start=cache_check(platforms_field, hits))
+        platform_list = platforms_field(upload.fields)
+        if not platform_list:
+            raise HTTPException(status_code=400, detail="At least one platform is required")
+        set_request_labels(platform=platform_list[0] if len(platform_list) == 1 else "multi")
+        if upload.path is None:
+            set_request_labels(cache_hit=True)
+            return MultiAnalyzeResponse(results={p: hits[p] for p in platform_list}, errors={})
+        outcomes = await analyze_media(platform_list, upload.path, upload.sha256)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Multi-platform analysis failed: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if upload and upload.path and os.path.exists(upload.path):
+            os.remove(upload.path)
+
+    response = MultiAnalyzeResponse(results={}, errors={})
+    for platform, outcome in outcomes.items():
+        if isinstance(outcome, Exception):
+            logger.error(f"Analysis failed for {platform}: {outcome}")
+            response.errors[platform] = str(outcome)
+        else:
+            response.results[platform] = outcome
+    if not response.results:
+        raise HTTPException(status_code=500, detail="; ".join(f"{p}: {e}" for p, e in response.errors.items()))
+    return response
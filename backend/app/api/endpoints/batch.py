@@ -0,0 +1,85 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator
+from app.api.endpoints.analyze import FILE_PROPERTY, SHA256_PATTERN, parse_platforms, platforms_field
+from app.models.schemas import BatchItemResult, BatchRequest
+from app.services.batch_service import BatchRun, BatchSource, check_location
+from app.services.media_service import remove_files
+from app.services.upload_service import multipart_openapi, stream_upload
+from app.core.config import settings
+from app.core.security import limiter
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+NDJSON_RESPONSE = {
+    200: {
+        "description": "One BatchItemResult JSON object per line, in completion order",
+        "content": {"application/x-ndjson": {"schema": BatchItemResult.model_json_schema()}},
+    }
+}
+
+def ndjson_stream(run: BatchRun) -> StreamingResponse:
+    async def lines() -> AsyncIterator[str]:
+        async for item in run.results():
+            yield item.model_dump_json() + "\n"
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/analyze/batch", responses=NDJSON_RESPONSE)
+@limiter.limit("5/minute")
+async def analyze_batch(request: Request, body: BatchRequest):
+    """
+    Analyzes a manifest of local paths and/or http(s) URLs, streaming NDJSON results.
+
+    Each item is answered from the cache when possible (before fetching it, if its
+    sha256 is given); items with identical content are analyzed once. Lines arrive
+    as items finish, so their order differs from the manifest; match them by `index`.
+    """
+    platforms = parse_platforms(body.platforms)
+    if not platforms:
+        raise HTTPException(status_code=400, detail="At least one platform is required")
+    if not body.items:
+        raise HTTPException(status_code=400, detail="At least one item is required")
+    if len(body.items) > settings.BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"A batch may hold at most {settings.BATCH_MAX_ITEMS} items")
+
+    sources = []
+    for index, item in enumerate(body.items):
+        if item.sha256 and not SHA256_PATTERN.match(item.sha256):
+            raise HTTPException(status_code=422, detail=f"Item {index}: sha256 must be 64 hex characters")
+        reason = check_location(item.path)
+        if reason:
+            raise HTTPException(status_code=403, detail=f"Item {index}: {reason}")
+        sources.append(BatchSource(index, item.id, item.path, item.sha256.lower() if item.sha256 else None))
+    return ndjson_stream(BatchRun(platforms, sources))
+
+@router.post(
+    "/analyze/batch/upload",
+    responses=NDJSON_RESPONSE,
+    openapi_extra=multipart_openapi(
+        {
+            "platforms": {"type": "array", "items": {"type": "string"}},
+            "files": {"type": "array", "items": FILE_PROPERTY},
+        },
+        ["platforms", "files"],
+    ),
+)
+@limiter.limit("5/minute")
+async def analyze_batch_upload(request: Request):
+    """
+    Analyzes many uploaded files, streaming NDJSON results as each one finishes.
+
+    Every `files` part is hashed as it is received; results are keyed by the
+    part's position (`index`) and filename (`id`).
+    """
+    upload = await stream_upload(request, file_field="files", max_files=settings.BATCH_MAX_ITEMS)
+    platforms = platforms_field(upload.fields)
+    if not platforms:
+        remove_files([staged.path for staged in upload.files])
+        raise HTTPException(status_code=400, detail="At least one platform is required")
+    sources = [
+        BatchSource(index, staged.filename, staged.path, staged.sha256, temporary=True, verified=True)
+        for index, staged in enumerate(upload.files)
+    ]
+    return ndjson_stream(BatchRun(platforms, sources))
@@ -3,15 +3,37 @@ from fastapi import APIRouter
 router = APIRouter()
 
 from fastapi import APIRouter, Request
+from fastapi.responses import JSONResponse, Response
 from app.core.config import settings
+from app.core.metrics import metrics_payload
 from app.services.gemini_service import MODEL_NAME
+from app.services.rag_service import rag_service
+from app.services.quota_service import quota_stats
+from app.services.redis_service import redis_service
 import os
 
 router = APIRouter()
 
 @router.get("/health")
 def health_check():
-    return {"status": "ok"}
+    """Liveness: the process is up and serving. Never depends on the RAG index."""
+    return {"status": "ok", "rag_index": rag_service.status}
+
+@router.get("/health/ready")
+def readiness_check():
+    """Readiness: the RAG index is open, so analyses get full policy context."""
+    body = {
+        "status": "ready" if rag_service.ready else "not_ready",
+        "rag_index": rag_service.status,
+        "index_version": rag_service.index_version,
+    }
+    return JSONResponse(status_code=200 if rag_service.ready else 503, content=body)
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus exposition: stage latency histograms, Gemini errors/retries, cache tiers, bytes uploaded."""
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
 
 @router.get("/debug")
 async def debug_info(request: Request):
@@ -24,5 +46,7 @@ async def debug_info(request: Request):
         "api_key_status": "present" if settings.GEMINI_API_KEY else "missing",
         "frontend_origin_configured": settings.FRONTEND_ORIGIN,
         "request_origin": request.headers.get("origin"),
+        "cache": redis_service.cache_stats(),
+        "gemini_quota": quota_stats(),
         "timestamp": datetime.now().isoformat()
     }
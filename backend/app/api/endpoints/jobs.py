@@ -0,0 +1,69 @@
+from fastapi import APIRouter, HTTPException, Request
+from typing import Dict
+from app.api.endpoints.analyze import FILE_PROPERTY, SHA256_PROPERTY, platform_field, cache_check
+from app.models.schemas import AnalyzeResponse, JobStatus
+from app.services.job_service import job_service, job_result
+from app.services.upload_service import declared_sha256, multipart_openapi, stream_upload
+from app.core.config import settings
+from app.core.metrics import set_request_labels
+from app.core.security import limiter
+import os
+import logging
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+@router.post(
+    "/jobs",
+    response_model=JobStatus,
+    status_code=202,
+    openapi_extra=multipart_openapi(
+        {"platform": {"type": "string"}, "sha256": SHA256_PROPERTY, "file": FILE_PROPERTY}, ["platform", "file"]
+    ),
+)
+@limiter.limit("5/minute")
+async def submit_job(request: Request):
+    """
+    Queues a video analysis and returns a job id immediately.
+
+    Poll GET /jobs/{job_id} for the stage and fetch GET /jobs/{job_id}/result once completed.
+    """
+    hits: Dict[str, AnalyzeResponse] = {}
+    upload = None
+    try:
+        upload = await stream_upload(
+            request, directory=settings.JOB_STAGING_DIR, on_file_start=cache_check(platform_field, hits)
+        )
+        platform = upload.field("platform")
+        if not platform:
+            raise HTTPException(status_code=422, detail="Missing form field 'platform'")
+        set_request_labels(platform=platform)
+        # On an early cache hit nothing was staged; submit() completes the job from the cache
+        file_hash = upload.sha256 or declared_sha256(upload.fields)
+        job = await job_service.submit(platform, upload.path, file_hash)
+        return JobStatus(**job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Job submission failed: {e}")
+        if upload and upload.path and os.path.exists(upload.path):
+            os.remove(upload.path)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def get_job(job_id: str):
+    job = await job_service.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return JobStatus(**job)
+
+@router.get("/jobs/{job_id}/result", response_model=AnalyzeResponse)
+async def get_job_result(job_id: str):
+    job = await job_service.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["stage"] == "failed":
+        raise HTTPException(status_code=500, detail=job["error"])
+    if job["stage"] != "completed":
+        raise HTTPException(status_code=409, detail=f"Job is not finished (stage: {job['stage']})")
+    return job_result(job)
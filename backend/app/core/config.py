@@ -1,7 +1,7 @@
 import os
 from pydantic_settings import BaseSettings
 
-from typing import Optional
+from typing import Dict, List, Optional
 
 class Settings(BaseSettings):
     GEMINI_API_KEY: Optional[str] = None
@@ -9,6 +9,139 @@ class Settings(BaseSettings):
     ENVIRONMENT: str = os.getenv("RAILWAY_ENVIRONMENT", "development")
     FRONTEND_ORIGIN: str = os.getenv("FRONTEND_ORIGIN", "http://localhost:5173")
 
+    # Result cache: a small in-process LRU in front of Redis. After
+    # CACHE_BREAKER_FAILURES consecutive Redis errors, Redis is skipped for
+    # CACHE_BREAKER_RESET_SECONDS before it is tried again.
+    CACHE_TTL_SECONDS: int = 86400
+    CACHE_LOCAL_MAX_ENTRIES: int = 1024
+    CACHE_LOCAL_TTL_SECONDS: int = 300
+    CACHE_BREAKER_FAILURES: int = 3
+    CACHE_BREAKER_RESET_SECONDS: int = 30
+    REDIS_MAX_CONNECTIONS: int = 50
+    # A burst beyond REDIS_MAX_CONNECTIONS waits this long for a free connection before erroring
+    REDIS_POOL_TIMEOUT_SECONDS: float = 2.0
+
+    # Worker threads for blocking RAG (llama_index / Chroma) calls made from async endpoints
+    RAG_MAX_WORKERS: int = 4
+    # Delay between background attempts to open the RAG index after a failed start
+    RAG_RETRY_SECONDS: int = 60
+    # Chroma index, ingest manifest and BM25 index; defaults to backend/chroma_db
+    RAG_PERSIST_DIR: Optional[str] = None
+    # Shared mode for several workers/replicas on one RAG_PERSIST_DIR: the index is built
+    # under an exclusive file lock into a new version directory and published atomically;
+    # other processes never write to it: they serve its precomputed policy context (and BM25
+    # for ad-hoc queries, without opening Chroma) and follow newer versions.
+    # With RAG_INGEST off a process never builds (run `python -m app.services.rag_service`).
+    RAG_SHARED_INDEX: bool = False
+    RAG_INGEST: bool = True
+    RAG_VERSION_POLL_SECONDS: float = 15.0
+    RAG_KEEP_VERSIONS: int = 3
+    # "vector" (Gemini embeddings + Chroma), "lexical" (local BM25, no network) or
+    # "hybrid" (both, reciprocal-rank fused). Vector searches slower than the
+    # timeout, or failing, fall back to lexical results.
+    RETRIEVAL_MODE: str = "hybrid"
+    RETRIEVAL_VECTOR_TIMEOUT_SECONDS: float = 5.0
+
+    # Policy context in analysis prompts: overlapping chunks are deduplicated and the
+    # best-ranked kept up to this many tokens (counted locally) per platform
+    PROMPT_CONTEXT_TOKENS: int = 1500
+    PROMPT_CONTEXT_TOKENS_BY_PLATFORM: Dict[str, int] = {}
+    # Gemini context caching of the instructions plus each platform's policy context.
+    # Prefixes under the model's minimum are sent inline; so is everything if caching fails.
+    PROMPT_CACHE_ENABLED: bool = True
+    PROMPT_CACHE_TTL_SECONDS: int = 3600
+    PROMPT_CACHE_MIN_TOKENS: int = 1024
+
+    # Admission control for Gemini calls. RPM/TPM budgets are shared by all replicas
+    # through Redis; concurrency caps are per worker process. 0 disables a limit.
+    QUOTA_GENERATE_RPM: int = 1000
+    QUOTA_GENERATE_TPM: int = 4_000_000
+    QUOTA_GENERATE_CONCURRENCY: int = 16
+    QUOTA_UPLOAD_RPM: int = 0
+    QUOTA_UPLOAD_CONCURRENCY: int = 8
+    # Flat TPM estimate per attached video (~300 tokens per second of a 1 minute clip)
+    QUOTA_FILE_TOKEN_ESTIMATE: int = 20000
+    QUOTA_MAX_RETRIES: int = 4
+    QUOTA_BACKOFF_SECONDS: float = 2.0
+    QUOTA_MAX_BACKOFF_SECONDS: float = 60.0
+    # Longest a call may queue for budget before failing with a "saturated" error
+    QUOTA_MAX_WAIT_SECONDS: int = 300
+
+    # Coalescing of identical in-flight analyses across replicas. The lease must outlive
+    # the slowest analysis (300s processing timeout plus generation).
+    SINGLEFLIGHT_LEASE_SECONDS: int = 420
+    SINGLEFLIGHT_WAIT_SECONDS: int = 420
+
+    # /analyze/text: transcripts for the same platform arriving within the window
+    # are analyzed together in one generate_content call
+    TEXT_BATCH_WINDOW_MS: int = 30
+    TEXT_BATCH_MAX_ITEMS: int = 8
+    TEXT_BATCH_MAX_CHARS: int = 60000
+    TEXT_MAX_CHARS: int = 50000
+
+    # Media preprocessing before upload to Gemini: a profile id from
+    # media_service.MEDIA_PROFILES, or "original" to upload the raw file
+    MEDIA_PROFILE: str = "analysis-720p"
+    MEDIA_MAX_PROCESSES: int = 2
+    MEDIA_TIMEOUT_SECONDS: int = 300
+
+    # Uploads are parsed off the wire; larger bodies are rejected with 413
+    MAX_UPLOAD_BYTES: int = 2 * 1024 * 1024 * 1024
+    UPLOAD_CHUNK_BYTES: int = 1024 * 1024
+
+    # Signs /analyze/preflight upload tokens; set it when running several replicas,
+    # otherwise each process signs with its own random secret
+    UPLOAD_TOKEN_SECRET: Optional[str] = None
+    UPLOAD_TOKEN_TTL_SECONDS: int = 3600
+
+    # Near-duplicate reuse: perceptual fingerprints (frame pHash + audio) let a
+    # re-encoded, slightly trimmed or watermarked repost reuse a cached verdict
+    # when its similarity reaches FINGERPRINT_SIMILARITY (1 = identical, 0 = unrelated;
+    # same visuals with different audio score about 0.7). Off by default: it decodes
+    # every cache miss before analysis, sharing the ffmpeg process limit with transcodes
+    FINGERPRINT_ENABLED: bool = False
+    FINGERPRINT_SIMILARITY: float = 0.75
+    FINGERPRINT_MAX_SECONDS: int = 1800
+    FINGERPRINT_MAX_OFFSET_SECONDS: int = 3
+
+    # Videos longer than this are split (stream copy, no re-encode) into overlapping
+    # segments that are analyzed concurrently; 0 disables segmenting
+    SEGMENT_THRESHOLD_SECONDS: int = 600
+    SEGMENT_SECONDS: int = 180
+    SEGMENT_OVERLAP_SECONDS: int = 5
+    SEGMENT_CONCURRENCY: int = 4
+
+    # Asynchronous analysis jobs: "redis" in production (needs Redis 6.2+ for BLMOVE),
+    # "memory" for tests/local runs
+    JOB_BACKEND: str = "redis"
+    JOB_WORKERS: int = 2
+    JOB_TTL_SECONDS: int = 3600 * 24
+    # Where job uploads wait for a worker; must be shared between replicas (defaults to the temp dir)
+    JOB_STAGING_DIR: Optional[str] = None
+
+    # Bulk /analyze/batch: items per request and how many are fetched and analyzed at
+    # once. Manifest paths must resolve under BATCH_LOCAL_ROOT and URLs must start with
+    # one of BATCH_URL_PREFIXES (e.g. "https://my-bucket.s3.amazonaws.com/" for
+    # presigned URLs); left unset, that kind of source is refused.
+    BATCH_MAX_ITEMS: int = 1000
+    BATCH_CONCURRENCY: int = 4
+    BATCH_LOCAL_ROOT: Optional[str] = None
+    BATCH_URL_PREFIXES: List[str] = []
+    BATCH_DOWNLOAD_TIMEOUT_SECONDS: int = 300
+
+    # Prometheus metrics are served on /metrics. With OTEL_ENABLED, analysis stages also
+    # emit OpenTelemetry spans: install opentelemetry-distro and start the server under
+    # opentelemetry-instrument, which picks the exporter from the OTEL_* environment.
+    OTEL_ENABLED: bool = False
+
+    # Policy ingestion embedding budget (Gemini allows up to 100 texts per batch request)
+    EMBED_BATCH_SIZE: int = 100
+    EMBED_REQUESTS_PER_MINUTE: int = 100
+    EMBED_MAX_CONCURRENCY: int = 4
+    EMBED_MAX_RETRIES: int = 5
+    # Defaults to chroma_db/embedding_cache.sqlite3
+    EMBEDDING_CACHE_PATH: Optional[str] = None
+
     class Config:
         env_file = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), ".env")
         extra = "ignore"
@@ -0,0 +1,154 @@
+from contextvars import ContextVar
+from typing import Optional, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess,
+)
+from app.core.config import settings
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Platform label for stage timings; set where the work is for one platform,
+# left empty for work shared by several (one upload analyzed for many platforms)
+current_platform: ContextVar[str] = ContextVar("metrics_platform", default="")
+
+# Labels the current request's endpoint fills in for the request histogram
+_request_labels: ContextVar[Optional[dict]] = ContextVar("metrics_request_labels", default=None)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_SECONDS = Histogram(
+    "contentshield_stage_seconds",
+    "Time spent in each analysis stage",
+    ["stage", "platform", "cache_hit"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "contentshield_request_seconds",
+    "Request latency until the response starts",
+    ["endpoint", "status", "platform", "cache_hit"],
+    buckets=LATENCY_BUCKETS,
+)
+QUOTA_WAIT_SECONDS = Histogram(
+    "contentshield_gemini_queue_seconds",
+    "Time Gemini calls spent queued for quota",
+    ["resource"],
+    buckets=LATENCY_BUCKETS,
+)
+GEMINI_ERRORS = Counter("contentshield_gemini_errors_total", "Failed Gemini calls", ["resource", "kind"])
+GEMINI_RETRIES = Counter("contentshield_gemini_retries_total", "Gemini calls retried after a rate-limit or overload error", ["resource"])
+CACHE_LOOKUPS = Counter("contentshield_cache_lookups_total", "Analysis cache lookups by tier", ["tier", "result"])
+UPLOAD_BYTES = Counter("contentshield_upload_bytes_total", "Media bytes received from clients and sent to Gemini", ["destination"])
+RAG_CHUNKS = Histogram(
+    "contentshield_rag_chunks",
+    "Policy chunks returned per retrieval",
+    ["mode", "degraded"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 20),
+)
+PROMPT_TOKENS = Histogram(
+    "contentshield_prompt_tokens",
+    "Estimated tokens per analysis prompt: policy context, and the part not served from a context cache",
+    ["part"],
+    buckets=(64, 128, 256, 512, 1024, 1536, 2048, 3072, 4096, 8192),
+)
+
+_tracer = None
+
+def _get_tracer():
+    """OpenTelemetry tracer when OTEL_ENABLED and the API is installed, otherwise None."""
+    global _tracer
+    if _tracer is None and settings.OTEL_ENABLED:
+        try:
+            from opentelemetry import trace
+            _tracer = trace.get_tracer("contentshield")
+        except ImportError:
+            logger.warning("OTEL_ENABLED is set but opentelemetry-api is not installed; spans are disabled")
+            _tracer = False
+    return _tracer or None
+
+def _label(value: bool) -> str:
+    return "true" if value else "false"
+
+def platform_label(platform: str) -> str:
+    """Bounds the platform label: a supported platform id, "multi", "" or "other" for any other client text."""
+    if platform in ("", "multi"):
+        return platform
+    # rag_service imports this module, so import it lazily
+    from app.services.rag_service import SUPPORTED_PLATFORMS, normalize_platform
+
+    platform = normalize_platform(platform)
+    return platform if platform in SUPPORTED_PLATFORMS else "other"
+
+class StageTimer:
+    """Times a block into contentshield_stage_seconds (and an OpenTelemetry span when enabled).
+
+    Set `cache_hit` inside the block when the stage was answered from a cache.
+    """
+
+    def __init__(self, name: str, platform: Optional[str] = None, cache_hit: bool = False):
+        self.name = name
+        self.platform = current_platform.get() if platform is None else platform
+        self.cache_hit = cache_hit
+        self._span = None
+
+    def __enter__(self) -> "StageTimer":
+        tracer = _get_tracer()
+        if tracer:
+            self._span = tracer.start_as_current_span(f"stage.{self.name}", attributes={"platform": self.platform})
+            self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.name, time.perf_counter() - self._start, self.platform, self.cache_hit)
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, tb)
+        return False
+
+def stage(name: str, platform: Optional[str] = None, cache_hit: bool = False) -> StageTimer:
+    return StageTimer(name, platform, cache_hit)
+
+def observe_stage(name: str, seconds: float, platform: Optional[str] = None, cache_hit: bool = False):
+    platform = current_platform.get() if platform is None else platform
+    STAGE_SECONDS.labels(name, platform_label(platform), _label(cache_hit)).observe(seconds)
+
+def set_request_labels(platform: Optional[str] = None, cache_hit: Optional[bool] = None):
+    """Labels the current request in contentshield_request_seconds; a no-op outside a request."""
+    labels = _request_labels.get()
+    if labels is None:
+        return
+    if platform is not None:
+        labels["platform"] = platform_label(platform)
+    if cache_hit is not None:
+        labels["cache_hit"] = _label(cache_hit)
+
+class RequestTimer:
+    """Times one HTTP request; the endpoint fills in its labels with set_request_labels()."""
+
+    def __init__(self):
+        self.labels = {"platform": "", "cache_hit": "false"}
+
+    def __enter__(self) -> "RequestTimer":
+        # The endpoint runs in a copy of this context, but mutates the same dict
+        self._token = _request_labels.set(self.labels)
+        self._start = time.perf_counter()
+        return self
+
+    def observe(self, endpoint: str, status: int):
+        REQUEST_SECONDS.labels(endpoint, str(status), self.labels["platform"], self.labels["cache_hit"]).observe(
+            time.perf_counter() - self._start
+        )
+
+    def __exit__(self, exc_type, exc, tb):
+        _request_labels.reset(self._token)
+        return False
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Exposition for /metrics, aggregated across worker processes in multiprocess mode."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
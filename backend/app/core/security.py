@@ -1,10 +1,30 @@
-import redis
+import hashlib
+import hmac
+import secrets
+import time
+import redis.asyncio as aioredis
 from slowapi import Limiter
 from slowapi.util import get_remote_address
 from app.core.config import settings
 
-def get_redis_client():
-    return redis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+def get_async_redis_client(pool: "aioredis.ConnectionPool" = None):
+    if pool is not None:
+        return aioredis.Redis(connection_pool=pool)
+    return aioredis.from_url(settings.REDIS_URL, encoding="utf-8", decode_responses=True)
+
+def get_async_redis_pool(decode_responses: bool = True) -> "aioredis.ConnectionPool":
+    """A connection pool to share across clients; binary values need decode_responses=False.
+
+    When every connection is in use, callers queue briefly for one instead of failing
+    with "Too many connections", which would count towards the Redis circuit breaker.
+    """
+    return aioredis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        max_connections=settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+        decode_responses=decode_responses,
+        **({"encoding": "utf-8"} if decode_responses else {}),
+    )
 
 try:
     # We'll rely on the lazy connection or a deferred ping.
@@ -18,3 +38,21 @@ limiter = Limiter(
     key_func=get_remote_address,
     storage_uri=storage_uri
 )
+
+_token_secret = (settings.UPLOAD_TOKEN_SECRET or secrets.token_hex(32)).encode()
+
+def _sign_upload(platform: str, sha256: str, size: int, expires_at: int) -> str:
+    message = f"{platform}:{sha256.lower()}:{size}:{expires_at}".encode()
+    return hmac.new(_token_secret, message, hashlib.sha256).hexdigest()
+
+def create_upload_token(platform: str, sha256: str, size: int) -> tuple:
+    """Returns (token, expires_at) authorizing an upload of exactly these bytes for this platform."""
+    expires_at = int(time.time()) + settings.UPLOAD_TOKEN_TTL_SECONDS
+    return f"{expires_at}.{_sign_upload(platform, sha256, size, expires_at)}", expires_at
+
+def verify_upload_token(token: str, platform: str, sha256: str, size: int) -> bool:
+    """Checks the token against what was actually received, so a token can't vouch for other bytes."""
+    expires_at, _, signature = token.partition(".")
+    if not expires_at.isdigit() or int(expires_at) < time.time():
+        return False
+    return hmac.compare_digest(signature, _sign_upload(platform, sha256, size, int(expires_at)))
@@ -1,25 +1,38 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from app.core.config import settings
+from app.core.metrics import RequestTimer
 from app.core.security import limiter
-from app.api.endpoints import analyze, health
+from app.api.endpoints import analyze, batch, health, jobs
+from app.services.job_service import job_service
+from app.services.quota_service import bind_event_loop
+from app.services.rag_service import rag_service
 import logging
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="Content Shield API")
-
-# Startup Log
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     logger.info(f"Content Shield API starting up in {settings.ENVIRONMENT} mode")
     if not settings.GEMINI_API_KEY:
         logger.warning("GEMINI_API_KEY is not set. AI features will fail.")
     logger.info(f"Frontend origin allowed: {settings.FRONTEND_ORIGIN}")
+    # Gemini calls from ingestion's worker thread queue behind interactive ones on this loop
+    bind_event_loop()
+    # Build/open the RAG index in the background; requests are served (with degraded
+    # policy context) until it is ready. Readiness is reported on /health/ready.
+    rag_service.start_background()
+    job_service.start()
+    yield
+    await job_service.stop()
+    await rag_service.stop()
+
+app = FastAPI(title="Content Shield API", lifespan=lifespan)
 
 # Rate Limiter Setup
 app.state.limiter = limiter
@@ -42,8 +55,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request latency for /metrics, by route template and status; endpoints add platform and cache-hit labels
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    with RequestTimer() as timer:
+        response = await call_next(request)
+        route = request.scope.get("route")
+        timer.observe(route.path if route else "unmatched", response.status_code)
+    return response
+
 # Include Routers
 app.include_router(analyze.router)
+app.include_router(batch.router, tags=["Batch"])
+app.include_router(jobs.router, tags=["Jobs"])
 app.include_router(health.router, tags=["Health"])
 
 if __name__ == "__main__":
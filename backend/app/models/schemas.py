@@ -17,3 +17,61 @@ class AnalyzeResponse(BaseModel):
     risk_level: str
     summary_rationale: Optional[str] = None
     issues: List[Issue]
+
+class PreflightRequest(BaseModel):
+    platform: str
+    sha256: str
+    size: int
+
+class PreflightResponse(BaseModel):
+    # "cached": `result` holds the verdict; "upload_required": upload with `upload_token`
+    status: str
+    result: Optional[AnalyzeResponse] = None
+    upload_token: Optional[str] = None
+    expires_at: Optional[int] = None
+
+class TextVerdict(BaseModel):
+    # One transcript's verdict inside a batched text analysis
+    id: str
+    risk_level: str
+    summary_rationale: Optional[str] = None
+    issues: List[Issue]
+
+class TextBatchResult(BaseModel):
+    results: List[TextVerdict]
+
+class MultiAnalyzeResponse(BaseModel):
+    results: Dict[str, AnalyzeResponse]
+    errors: Dict[str, str] = {}
+
+class BatchItem(BaseModel):
+    # A local path under BATCH_LOCAL_ROOT or an http(s) URL (e.g. a presigned object-store URL)
+    path: str
+    id: Optional[str] = None
+    # Optional hex SHA-256; lets cached items be answered without fetching them
+    sha256: Optional[str] = None
+
+class BatchRequest(BaseModel):
+    platforms: List[str]
+    items: List[BatchItem]
+
+class BatchItemResult(BaseModel):
+    # One NDJSON line of /analyze/batch, emitted as soon as the item finishes
+    index: int
+    id: Optional[str] = None
+    sha256: Optional[str] = None
+    cached: bool = False
+    # Index of the earlier item with the same content whose analysis was shared
+    duplicate_of: Optional[int] = None
+    results: Dict[str, AnalyzeResponse] = {}
+    errors: Dict[str, str] = {}
+    # Set when the item could not be fetched or hashed
+    error: Optional[str] = None
+
+class JobStatus(BaseModel):
+    job_id: str
+    platform: str
+    stage: str
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
@@ -0,0 +1,300 @@
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+from app.core.config import settings
+from app.core.metrics import current_platform, set_request_labels, stage
+from app.models.schemas import AnalyzeResponse, Issue
+from app.services.fingerprint_service import compute_fingerprint, fingerprint_index
+from app.services.gemini_service import StageCallback, prepare_media, report_stage
+from app.services.redis_service import redis_service
+from app.services.media_service import (
+    ORIGINAL_PROFILE, active_profile, preprocess_media, probe_duration, remove_files, split_segments,
+)
+from app.services.prompt_service import generate_policy_analysis
+from app.services.rag_service import rag_service
+from app.services.singleflight import analysis_flight
+import asyncio
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+
+def media_id(file_hash: str, profile: Optional[str] = None) -> str:
+    """Identifies what is sent to Gemini: the original SHA-256 plus the preprocessing profile."""
+    profile = profile or active_profile()
+    return file_hash if profile == ORIGINAL_PROFILE else f"{file_hash}:{profile}"
+
+def analysis_cache_key(platform: str, file_hash: str, profile: Optional[str] = None) -> str:
+    # Results depend on the profile the model saw, so it is part of the key
+    return f"analyze:{platform}:{media_id(file_hash, profile)}"
+
+async def find_cached_analysis(platform: str, file_hash: str, profile: Optional[str] = None) -> Optional[dict]:
+    """The cached result for the profile, else the one cached when its preprocessing fell back to the original."""
+    keys = (analysis_cache_key(platform, file_hash, profile), analysis_cache_key(platform, file_hash, ORIGINAL_PROFILE))
+    for key in dict.fromkeys(keys):
+        cached = await redis_service.get_cached_analysis(key)
+        if cached:
+            return cached
+    return None
+
+def parse_analysis(json_response_text: str) -> dict:
+    """Parses Gemini's JSON output, tolerating markdown code fences."""
+    with stage("parse"):
+        # Clean potential markdown backticks
+        cleaned_text = json_response_text.strip()
+        if cleaned_text.startswith("```json"):
+            cleaned_text = cleaned_text[7:]
+        if cleaned_text.startswith("```"):
+            cleaned_text = cleaned_text[3:]
+        if cleaned_text.endswith("```"):
+            cleaned_text = cleaned_text[:-3]
+        return json.loads(cleaned_text.strip())
+
+class Segment(NamedTuple):
+    """A span of the original video and a getter for its ACTIVE Gemini file and the profile it was sent as."""
+    start: float
+    end: Optional[float]
+    get_media: Callable[[], Awaitable[Tuple[object, str]]]
+
+RISK_ORDER = {"low": 0, "medium": 1, "high": 2}
+_TIMESTAMP_RE = re.compile(r"\b(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\b")
+
+def format_timestamp(seconds: float) -> str:
+    seconds = int(round(max(0.0, seconds)))
+    hours, remainder = divmod(seconds, 3600)
+    minutes, secs = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Returns the first MM:SS / HH:MM:SS in the value, in seconds."""
+    match = _TIMESTAMP_RE.search(value or "")
+    if not match:
+        return None
+    hours, minutes, secs = match.groups()
+    return int(hours or 0) * 3600 + int(minutes) * 60 + int(secs)
+
+def shift_timestamp(value: Optional[str], segment: Segment) -> str:
+    """Moves a segment-relative timestamp (or range) onto the original video's timeline."""
+    if not value or not _TIMESTAMP_RE.search(value):
+        # e.g. "Entire Video" means the whole segment
+        end = format_timestamp(segment.end) if segment.end is not None else "end"
+        return f"{format_timestamp(segment.start)}-{end}"
+    return _TIMESTAMP_RE.sub(
+        lambda m: format_timestamp(segment.start + parse_timestamp(m.group(0))), value
+    )
+
+def merge_segment_results(platform: str, parts: List[Tuple[Segment, AnalyzeResponse]]) -> AnalyzeResponse:
+    """Combines per-segment verdicts into one: max risk, shifted and de-duplicated issues.
+
+    Issues of the same category within the segment overlap of each other are the
+    same event seen by two segments, and are kept once.
+    """
+    window = settings.SEGMENT_OVERLAP_SECONDS
+    top = max(parts, key=lambda part: RISK_ORDER.get(part[1].risk_level.lower(), 0))[1].risk_level
+
+    issues: List[Issue] = []
+    seen: List[Tuple[str, Optional[float], str]] = []
+    for segment, result in sorted(parts, key=lambda part: part[0].start):
+        for issue in result.issues:
+            shifted = issue.model_copy(update={"timestamp": shift_timestamp(issue.timestamp, segment)})
+            category = issue.category.strip().lower()
+            at = parse_timestamp(shifted.timestamp)
+            duplicate = any(
+                category == other_category
+                and (
+                    (at is not None and other_at is not None and abs(at - other_at) <= window)
+                    or (at is None and other_at is None and shifted.snippet == other_snippet)
+                )
+                for other_category, other_at, other_snippet in seen
+            )
+            if not duplicate:
+                seen.append((category, at, shifted.snippet))
+                issues.append(shifted)
+
+    summaries = [
+        f"[{format_timestamp(segment.start)}] {result.summary_rationale}"
+        for segment, result in sorted(parts, key=lambda part: part[0].start)
+        if result.summary_rationale and result.risk_level == top
+    ]
+    return AnalyzeResponse(
+        platform=platform,
+        risk_level=top,
+        summary_rationale=" ".join(summaries) or None,
+        issues=issues,
+    )
+
+async def _generate_for_platform(platform: str, file_hash: str, segments: List[Segment], on_stage: StageCallback = None) -> AnalyzeResponse:
+    # Runs in its own task per platform, so this labels only its stages (and any shared upload it leads)
+    current_platform.set(platform)
+    media, profile = await segments[0].get_media() if len(segments) == 1 else (None, None)
+
+    # Retrieve relevant policy documents using RAG
+    logger.info(f"Retrieving policies for platform: {platform}")
+    await report_stage(on_stage, "retrieving")
+    policy_context = await rag_service.get_policy_context(platform)
+
+    await report_stage(on_stage, "generating")
+    if media is not None:
+        result_dict = parse_analysis(await generate_policy_analysis(platform, policy_context, [media]))
+        # The shared instructions don't name the platform, so don't trust the model's echo of it
+        result_dict["platform"] = platform
+    else:
+        # Long video: analyze segments concurrently (bounded), then merge onto one timeline
+        semaphore = asyncio.Semaphore(settings.SEGMENT_CONCURRENCY)
+
+        async def analyze_segment(segment: Segment):
+            async with semaphore:
+                segment_media, segment_profile = await segment.get_media()
+                text = await generate_policy_analysis(platform, policy_context, [segment_media])
+            segment_dict = parse_analysis(text)
+            # As for whole videos, don't depend on the model echoing the platform
+            segment_dict["platform"] = platform
+            return segment, segment_profile, AnalyzeResponse(**segment_dict)
+
+        parts = await asyncio.gather(*(analyze_segment(segment) for segment in segments))
+        result_dict = merge_segment_results(platform, [(segment, result) for segment, _, result in parts]).model_dump()
+        profiles = {segment_profile for _, segment_profile, _ in parts}
+        profile = profiles.pop() if len(profiles) == 1 else None
+
+    # Validate with Pydantic
+    response_model = AnalyzeResponse(**result_dict)
+
+    # Cache the result (as dict) under the profile the model actually saw
+    if profile:
+        await redis_service.set_cached_analysis(analysis_cache_key(platform, file_hash, profile), result_dict)
+    else:
+        logger.warning(f"Not caching {platform} result: its segments were sent with different profiles")
+    return response_model
+
+async def _analyze_platform_once(
+    platform: str, file_hash: str, profile: str, segments: List[Segment], on_stage: StageCallback = None
+) -> AnalyzeResponse:
+    """Runs the analysis unless an identical one is already in flight, here or on another replica."""
+    async def load_result():
+        cached = await find_cached_analysis(platform, file_hash, profile)
+        return AnalyzeResponse(**cached) if cached else None
+
+    async def run():
+        return await _generate_for_platform(platform, file_hash, segments, on_stage)
+
+    return await analysis_flight.do(analysis_cache_key(platform, file_hash, profile), run, load_result=load_result)
+
+async def get_cached_results(platforms: List[str], file_hash: str) -> Dict[str, AnalyzeResponse]:
+    """Returns the cached verdicts for the platforms that have one."""
+    profile = active_profile()
+    cached = await asyncio.gather(*(find_cached_analysis(platform, file_hash, profile) for platform in platforms))
+    return {platform: AnalyzeResponse(**hit) for platform, hit in zip(platforms, cached) if hit}
+
+async def _reuse_near_duplicates(platforms: List[str], file_path: str, file_hash: str) -> Dict[str, AnalyzeResponse]:
+    """Finds verdicts cached for perceptually near-identical videos and indexes this one.
+
+    A reused verdict is the neighbour's as-is, so its timestamps may be off by
+    whatever was trimmed.
+    """
+    if not settings.FINGERPRINT_ENABLED:
+        return {}
+    fingerprint = await analysis_flight.do(f"fingerprint:{file_hash}", lambda: compute_fingerprint(file_path))
+    if fingerprint is None:
+        return {}
+    matches = await fingerprint_index.find_similar(file_hash, fingerprint, settings.FINGERPRINT_SIMILARITY)
+    await fingerprint_index.add(file_hash, fingerprint)
+
+    found: Dict[str, AnalyzeResponse] = {}
+    for neighbour, score in matches:
+        remaining = [platform for platform in platforms if platform not in found]
+        if not remaining:
+            break
+        for platform, hit in (await get_cached_results(remaining, neighbour)).items():
+            logger.info(f"Reusing {platform} verdict of near-duplicate {neighbour[:12]} (similarity {score:.2f})")
+            found[platform] = hit.model_copy(update={"platform": platform})
+    return found
+
+async def _plan_segments(file_path: str) -> List[Tuple[float, Optional[float], str]]:
+    """Splits videos longer than SEGMENT_THRESHOLD_SECONDS; otherwise one span covering the file."""
+    if settings.SEGMENT_THRESHOLD_SECONDS > 0:
+        duration = await probe_duration(file_path)
+        if duration and duration > settings.SEGMENT_THRESHOLD_SECONDS:
+            try:
+                segments = await split_segments(
+                    file_path, duration, settings.SEGMENT_SECONDS, settings.SEGMENT_OVERLAP_SECONDS
+                )
+                logger.info(f"Analyzing {duration:.0f}s video as {len(segments)} segments")
+                return segments
+            except Exception as e:
+                logger.error(f"Segmenting failed, analyzing the whole video: {str(e)}")
+    return [(0.0, None, file_path)]
+
+async def analyze_media(
+    platforms: List[str], file_path: str, file_hash: str, on_stage: StageCallback = None
+) -> Dict[str, Union[AnalyzeResponse, Exception]]:
+    """Analyzes one media file for each platform, returning a result or error per platform.
+
+    Cached platforms are answered from Redis, then from the cached verdicts of
+    near-duplicate videos (perceptual fingerprints). For the rest, the media is uploaded
+    (or reused) once and the per-platform generations run concurrently, joining
+    any identical analysis that is already in flight instead of repeating it.
+    Videos longer than SEGMENT_THRESHOLD_SECONDS are split into overlapping
+    segments that are analyzed in parallel and merged.
+    `on_stage` receives progress ("uploaded", "processing", "retrieving", "generating")
+    for work this call leads; joined work reports nothing.
+    """
+    profile = active_profile()
+    results: Dict[str, Union[AnalyzeResponse, Exception]] = dict(await get_cached_results(platforms, file_hash))
+    misses = [platform for platform in platforms if platform not in results]
+    if not misses:
+        set_request_labels(cache_hit=True)
+        return results
+
+    near = await _reuse_near_duplicates(misses, file_path, file_hash)
+    for platform, result in near.items():
+        # Store under the exact key too, so the next lookup is a plain cache hit
+        await redis_service.set_cached_analysis(analysis_cache_key(platform, file_hash, profile), result.model_dump())
+    results.update(near)
+    misses = [platform for platform in misses if platform not in near]
+    if not misses:
+        set_request_labels(cache_hit=True)
+        return results
+
+    spans = await _plan_segments(file_path)
+
+    def media_getter(start: float, end: Optional[float], path: str):
+        span = "" if end is None else f":seg{start:.0f}-{end:.0f}"
+        media_key = f"{media_id(file_hash, profile)}{span}"
+        original_key = f"{media_id(file_hash, ORIGINAL_PROFILE)}{span}"
+
+        async def upload():
+            sent = profile
+
+            async def preprocess(upload_path: str) -> str:
+                nonlocal sent
+                processed_path = await preprocess_media(upload_path, profile)
+                if processed_path == upload_path:
+                    sent = ORIGINAL_PROFILE
+                return processed_path
+
+            media = await prepare_media(
+                path, file_hash=media_key, on_stage=on_stage, preprocess=preprocess, unprocessed_hash=original_key
+            )
+            return media, sent
+
+        async def get_media():
+            # Concurrent requests for the same bytes share one preprocess + upload
+            return await analysis_flight.do(f"media:{media_key}", upload)
+        return get_media
+
+    segments = [Segment(start, end, media_getter(start, end, path)) for start, end, path in spans]
+    try:
+        outcomes = await asyncio.gather(
+            *(_analyze_platform_once(platform, file_hash, profile, segments, on_stage) for platform in misses),
+            return_exceptions=True,
+        )
+    finally:
+        remove_files([path for _, _, path in spans if path != file_path])
+    for platform, outcome in zip(misses, outcomes):
+        if isinstance(outcome, asyncio.CancelledError):
+            # Not this call's cancellation (gather would have raised): something it
+            # awaited was cancelled from elsewhere
+            outcome = Exception("Analysis was cancelled")
+        elif isinstance(outcome, BaseException) and not isinstance(outcome, Exception):
+            raise outcome
+        results[platform] = outcome
+    return results
@@ -0,0 +1,162 @@
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.models.schemas import BatchItemResult
+from app.services.analysis_service import analyze_media, get_cached_results
+from app.services.media_service import remove_files
+from app.services.quota_service import PRIORITY_BATCH, current_priority
+import asyncio
+import hashlib
+import httpx
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+class BatchSource(NamedTuple):
+    """One batch item: a staged upload, a local path or an http(s) URL."""
+    index: int
+    id: Optional[str]
+    location: str
+    sha256: Optional[str] = None
+    # Staged uploads are deleted once the item is done; manifest files never are
+    temporary: bool = False
+    # The sha256 was computed here (staged uploads), not declared by the client
+    verified: bool = False
+
+def _hash_file(path: str) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(settings.UPLOAD_CHUNK_BYTES):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+def is_url(location: str) -> bool:
+    return location.startswith(("http://", "https://"))
+
+def check_location(location: str) -> Optional[str]:
+    """Returns why a manifest location is refused, or None when it may be read."""
+    if is_url(location):
+        if not any(location.startswith(prefix) for prefix in settings.BATCH_URL_PREFIXES):
+            return "URL is not under an allowed BATCH_URL_PREFIXES prefix"
+        return None
+    if not settings.BATCH_LOCAL_ROOT:
+        return "Local paths are disabled (BATCH_LOCAL_ROOT is not set)"
+    root = os.path.realpath(settings.BATCH_LOCAL_ROOT)
+    if os.path.commonpath([root, os.path.realpath(location)]) != root:
+        return "Path is outside BATCH_LOCAL_ROOT"
+    return None
+
+async def _download(url: str) -> Tuple[str, str]:
+    """Streams a URL to a temp file, hashing it on the way. Returns (tmp_path, sha256)."""
+    sha256_hash = hashlib.sha256()
+    max_bytes = settings.MAX_UPLOAD_BYTES
+    suffix = os.path.splitext(url.split("?", 1)[0])[1] or ".mp4"
+    fd, tmp_path = tempfile.mkstemp(suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(fd, "wb", buffering=settings.UPLOAD_CHUNK_BYTES) as tmp:
+            async with httpx.AsyncClient(timeout=settings.BATCH_DOWNLOAD_TIMEOUT_SECONDS) as client:
+                async with client.stream("GET", url) as response:
+                    if response.status_code != 200:
+                        raise Exception(f"Download failed with HTTP {response.status_code}")
+                    async for chunk in response.aiter_bytes(settings.UPLOAD_CHUNK_BYTES):
+                        size += len(chunk)
+                        if max_bytes and size > max_bytes:
+                            raise Exception(f"Download exceeds the {max_bytes} byte limit")
+                        sha256_hash.update(chunk)
+                        tmp.write(chunk)
+        return tmp_path, sha256_hash.hexdigest()
+    except BaseException:
+        remove_files([tmp_path])
+        raise
+
+class BatchRun:
+    """Analyzes many media files for a set of platforms, yielding each item as it finishes.
+
+    Items with a known SHA-256 are answered from the cache before being fetched.
+    Items sharing content are analyzed once. At most BATCH_CONCURRENCY items are
+    fetched or analyzed at a time, and their Gemini calls queue at batch priority
+    behind interactive requests.
+    """
+
+    def __init__(self, platforms: List[str], sources: List[BatchSource]):
+        self.platforms = platforms
+        self.sources = sources
+        self._semaphore = asyncio.Semaphore(settings.BATCH_CONCURRENCY)
+        # sha256 -> (index of the first item with that content, its analysis)
+        self._by_hash: Dict[str, Tuple[int, asyncio.Future]] = {}
+
+    async def results(self) -> AsyncIterator[BatchItemResult]:
+        # Tasks copy the context, so every Gemini call they make is scheduled as batch work
+        current_priority.set(PRIORITY_BATCH)
+        tasks = [asyncio.create_task(self._process(source)) for source in self.sources]
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield await task
+        finally:
+            # The client went away or the batch is done: stop whatever is still running
+            pending = tasks + [analysis for _, analysis in self._by_hash.values()]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            # Tasks cancelled before they started never cleaned up after themselves
+            remove_files([source.location for source in self.sources if source.temporary])
+
+    async def _process(self, source: BatchSource) -> BatchItemResult:
+        item = BatchItemResult(index=source.index, id=source.id, sha256=source.sha256)
+        path = None if is_url(source.location) else source.location
+        temporary = source.temporary
+        try:
+            # A declared hash is trusted only to look up the cache before fetching, as with
+            # /analyze's early cache check; analysis and dedupe use the hash of the content
+            if source.sha256 and await self._from_cache(item, source.sha256):
+                return item
+
+            file_hash = source.sha256 if source.verified else None
+            if file_hash is None:
+                async with self._semaphore:
+                    if path is None:
+                        path, file_hash = await _download(source.location)
+                        temporary = True
+                    else:
+                        file_hash = await asyncio.to_thread(_hash_file, path)
+                if source.sha256 and source.sha256 != file_hash:
+                    raise Exception("sha256 does not match the item's content")
+                item.sha256 = file_hash
+                if not source.sha256 and await self._from_cache(item, file_hash):
+                    return item
+
+            leader = self._by_hash.get(file_hash)
+            if leader is None:
+                leader = self._by_hash[file_hash] = (source.index, asyncio.ensure_future(self._analyze(path, file_hash)))
+            else:
+                item.duplicate_of = leader[0]
+            outcomes = await asyncio.shield(leader[1])
+            for platform, outcome in outcomes.items():
+                if isinstance(outcome, Exception):
+                    item.errors[platform] = str(outcome)
+                else:
+                    item.results[platform] = outcome
+        except Exception as e:
+            logger.error(f"Batch item {source.index} failed: {str(e)}")
+            item.error = str(e)
+        finally:
+            if temporary and path:
+                remove_files([path])
+        return item
+
+    async def _from_cache(self, item: BatchItemResult, file_hash: str) -> bool:
+        """Fills the item from the cache when every platform is cached and no earlier item has this content."""
+        if file_hash in self._by_hash:
+            return False
+        hits = await get_cached_results(self.platforms, file_hash)
+        if len(hits) < len(self.platforms):
+            return False
+        item.results = hits
+        item.cached = True
+        return True
+
+    async def _analyze(self, path: str, file_hash: str):
+        async with self._semaphore:
+            return await analyze_media(self.platforms, path, file_hash)
@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.schema import BaseNode, MetadataMode
+
+logger = logging.getLogger(__name__)
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def _is_rate_limit_error(e: Exception) -> bool:
+    message = str(e)
+    return "429" in message or "Resource exhausted" in message or "RESOURCE_EXHAUSTED" in message
+
+class EmbeddingCache:
+    """Disk-backed embedding cache keyed by (model_name, sha256(chunk text)).
+
+    Lives outside the Chroma collection, so rebuilding or re-chunking the index
+    never pays for an embedding that was already computed.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model_name TEXT NOT NULL, text_hash TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model_name, text_hash))"
+        )
+        self._conn.commit()
+
+    def get_many(self, model_name: str, text_hashes: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(set(text_hashes))
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                chunk = unique[i:i + 500]
+                placeholders = ",".join("?" for _ in chunk)
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model_name = ? AND text_hash IN ({placeholders})",
+                    [model_name, *chunk],
+                ).fetchall()
+                for text_hash, blob in rows:
+                    found[text_hash] = array("f", blob).tolist()
+        return found
+
+    def put_many(self, model_name: str, vectors: Dict[str, List[float]]):
+        rows = [(model_name, text_hash, array("f", vector).tobytes()) for text_hash, vector in vectors.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model_name, text_hash, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+
+class RequestRateLimiter:
+    """Spaces request starts evenly so at most `requests_per_minute` begin per minute."""
+
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute if requests_per_minute > 0 else 0.0
+        self._next_slot = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next_slot - now
+            self._next_slot = max(now, self._next_slot) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+class EmbeddingPipeline:
+    """Embeds chunks in sized batches, concurrently, within a requests-per-minute budget.
+
+    Works with any llama_index BaseEmbedding, so ingestion can be exercised
+    offline with e.g. `MockEmbedding(embed_dim=8)` in place of GeminiEmbedding.
+    """
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        cache: Optional[EmbeddingCache] = None,
+        batch_size: int = 100,
+        requests_per_minute: int = 100,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        scheduler=None,
+    ):
+        self.embed_model = embed_model
+        # Optional QuotaScheduler; replaces the local rate limiter and retries when given. Its
+        # calls from embed_nodes' own loop are admitted on the server's, next to interactive ones
+        self.scheduler = scheduler
+        self.cache = cache
+        self.batch_size = max(1, batch_size)
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.embed_model, "model_name", None) or type(self.embed_model).__name__
+
+    async def _embed_batch(self, texts: List[str], limiter: RequestRateLimiter, semaphore: asyncio.Semaphore) -> List[List[float]]:
+        if self.scheduler is not None:
+            from app.services.quota_service import PRIORITY_INGEST
+
+            return await self.scheduler.run(
+                lambda: self.embed_model.aget_text_embedding_batch(texts), priority=PRIORITY_INGEST
+            )
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                await limiter.acquire()
+                try:
+                    return await self.embed_model.aget_text_embedding_batch(texts)
+                except Exception as e:
+                    if not _is_rate_limit_error(e) or attempt == self.max_retries:
+                        raise
+                    # Exponential backoff with jitter so concurrent batches don't retry in lockstep
+                    delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                    logger.warning(f"Embedding rate limited, retrying batch of {len(texts)} in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+
+    async def aembed_texts(self, texts: Sequence[str]) -> List[List[float]]:
+        """Returns one embedding per text, serving repeats from the cache."""
+        hashes = [_text_hash(text) for text in texts]
+        vectors = self.cache.get_many(self.model_name, hashes) if self.cache else {}
+
+        # Embed each distinct uncached text once
+        pending: Dict[str, str] = {}
+        for text_hash, text in zip(hashes, texts):
+            if text_hash not in vectors:
+                pending.setdefault(text_hash, text)
+
+        if pending:
+            logger.info(
+                f"Embedding {len(pending)} chunks ({len(texts) - len(pending)} cached) "
+                f"in batches of {self.batch_size} at <= {self.requests_per_minute} RPM"
+            )
+            limiter = RequestRateLimiter(self.requests_per_minute)
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            items = list(pending.items())
+            batches = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+
+            async def run(batch):
+                embeddings = await self._embed_batch([text for _, text in batch], limiter, semaphore)
+                computed = {text_hash: vector for (text_hash, _), vector in zip(batch, embeddings)}
+                # Persist per batch so a failure later in the run keeps what was already paid for
+                if self.cache:
+                    self.cache.put_many(self.model_name, computed)
+                vectors.update(computed)
+
+            await asyncio.gather(*(run(batch) for batch in batches))
+
+        return [vectors[text_hash] for text_hash in hashes]
+
+    async def aembed_nodes(self, nodes: Sequence[BaseNode]):
+        """Sets `embedding` on every node that doesn't have one yet."""
+        targets = [node for node in nodes if node.embedding is None]
+        texts = [node.get_content(metadata_mode=MetadataMode.EMBED) for node in targets]
+        for node, vector in zip(targets, await self.aembed_texts(texts)):
+            node.embedding = vector
+
+    def embed_nodes(self, nodes: Sequence[BaseNode]):
+        """Synchronous entry point for ingestion code running outside an event loop."""
+        asyncio.run(self.aembed_nodes(nodes))
@@ -0,0 +1,229 @@
+from typing import Dict, List, NamedTuple, Optional
+from app.core.config import settings
+from app.services.media_service import run_ffmpeg
+from app.services.redis_service import redis_service
+import asyncio
+import logging
+import shutil
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FRAME_SIZE = 32
+AUDIO_RATE = 8000
+AUDIO_FRAME = 2048
+AUDIO_HOP = 1024
+AUDIO_HOPS_PER_SECOND = AUDIO_RATE / AUDIO_HOP
+# Audio frames transformed at a time, bounding the working set to a few MB for any length
+AUDIO_BLOCK_FRAMES = 256
+# Each 64-bit frame hash is indexed as 4 bands of 16 bits: two frames within
+# Hamming distance 3 always share at least one band exactly
+BANDS = 4
+BAND_BITS = 16
+# Frames this flat (fades, black/white cards) match everything; they are scored but not indexed
+FLAT_FRAME_STD = 2.0
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    return np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+
+_DCT = _dct_matrix(FRAME_SIZE)
+
+class Fingerprint(NamedTuple):
+    """Perceptual fingerprint: one 64-bit pHash per sampled second and a 32-bit audio hash per hop."""
+    frames: np.ndarray  # uint64
+    flat: np.ndarray    # bool, frames too uniform to index
+    audio: np.ndarray   # uint32, empty when there is no audio track
+
+    def to_dict(self) -> dict:
+        return {
+            "frames": [int(v) for v in self.frames],
+            "flat": [bool(v) for v in self.flat],
+            "audio": [int(v) for v in self.audio],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Fingerprint":
+        return cls(
+            np.array(data["frames"], dtype=np.uint64),
+            np.array(data["flat"], dtype=bool),
+            np.array(data["audio"], dtype=np.uint32),
+        )
+
+def frame_hashes(gray: np.ndarray) -> np.ndarray:
+    """pHash of each 32x32 frame: low-frequency 8x8 DCT coefficients against their median."""
+    coefficients = _DCT @ gray.astype(np.float64) @ _DCT.T
+    low = coefficients[:, :8, :8].reshape(len(gray), 64)
+    bits = low > np.median(low[:, 1:], axis=1, keepdims=True)
+    return (bits.astype(np.uint64) << np.arange(64, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+def audio_hashes(samples: np.ndarray) -> np.ndarray:
+    """Haitsma-Kalker style sub-fingerprints: signs of band-energy differences across time and frequency."""
+    count = 1 + (len(samples) - AUDIO_FRAME) // AUDIO_HOP
+    if count < 2:
+        return np.zeros(0, dtype=np.uint32)
+    window = np.hanning(AUDIO_FRAME).astype(np.float32)
+    frequencies = np.fft.rfftfreq(AUDIO_FRAME, 1 / AUDIO_RATE)
+    edges = np.geomspace(300, 2000, 34)
+    bands = [(frequencies >= lo) & (frequencies < hi) for lo, hi in zip(edges[:-1], edges[1:])]
+    # Frame the (int16) samples a block at a time instead of materializing every frame at once
+    energy = np.empty((count, len(bands)), dtype=np.float64)
+    for start in range(0, count, AUDIO_BLOCK_FRAMES):
+        frames = min(AUDIO_BLOCK_FRAMES, count - start)
+        index = np.arange(AUDIO_FRAME)[None, :] + AUDIO_HOP * np.arange(start, start + frames)[:, None]
+        spectrum = np.abs(np.fft.rfft(samples[index].astype(np.float32) * window, axis=1)) ** 2
+        energy[start:start + frames] = np.stack([spectrum[:, band].sum(axis=1) for band in bands], axis=1)
+    # Log energies with a floor 30 dB under each frame's loudest band, so near-silent
+    # bands compare equal (bit 0) instead of flipping on codec noise
+    energy = np.log10(np.maximum(energy, 1e-3 * energy.max(axis=1, keepdims=True)) + 1e-9)
+    diff = energy[:, :-1] - energy[:, 1:]
+    bits = (diff[1:] - diff[:-1]) > 0
+    return (bits.astype(np.uint32) << np.arange(32, dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    as_bytes = values.view(np.uint8).reshape(len(values), -1)
+    return np.unpackbits(as_bytes, axis=1).sum(axis=1)
+
+def _best_aligned_bit_error(a: np.ndarray, b: np.ndarray, max_offset: int, bits: int) -> Optional[float]:
+    """Lowest mean bit error rate between the sequences over shifts of up to `max_offset` items."""
+    best = None
+    for offset in range(-max_offset, max_offset + 1):
+        left, right = (a[offset:], b) if offset >= 0 else (a, b[-offset:])
+        length = min(len(left), len(right))
+        if length == 0:
+            continue
+        error = _popcount(np.bitwise_xor(left[:length], right[:length])).mean() / bits
+        best = error if best is None else min(best, error)
+    return best
+
+def similarity(a: Fingerprint, b: Fingerprint) -> float:
+    """0..1 similarity; tolerates re-encoding, watermarks and a few seconds of trim."""
+    max_offset = settings.FINGERPRINT_MAX_OFFSET_SECONDS
+    # A clip and a much longer or shorter video are not duplicates even if they share frames
+    if abs(len(a.frames) - len(b.frames)) > max(2 * max_offset, 0.05 * max(len(a.frames), len(b.frames))):
+        return 0.0
+    video_error = _best_aligned_bit_error(a.frames, b.frames, max_offset, 64)
+    if video_error is None:
+        return 0.0
+    # Unrelated hashes differ in about half their bits, so rescale chance level to 0
+    video = max(0.0, 1.0 - 2 * video_error)
+    if not len(a.audio) or not len(b.audio):
+        return video
+    audio_error = _best_aligned_bit_error(a.audio, b.audio, int(max_offset * AUDIO_HOPS_PER_SECOND), 32)
+    audio = max(0.0, 1.0 - 2 * audio_error) if audio_error is not None else 0.0
+    return 0.7 * video + 0.3 * audio
+
+async def compute_fingerprint(file_path: str) -> Optional[Fingerprint]:
+    """Samples one frame per second and a mono 8 kHz audio track with ffmpeg and hashes them.
+
+    Returns None without ffmpeg, when decoding fails, or for videos longer
+    than FINGERPRINT_MAX_SECONDS (a truncated fingerprint would match any
+    video sharing the same opening).
+    """
+    if not shutil.which("ffmpeg"):
+        return None
+    limit = settings.FINGERPRINT_MAX_SECONDS
+    base = ["ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-t", str(limit + 1), "-i", file_path]
+    video_task = run_ffmpeg(base + [
+        "-map", "0:v:0", "-vf", f"fps=1,scale={FRAME_SIZE}:{FRAME_SIZE},format=gray",
+        "-f", "rawvideo", "-pix_fmt", "gray", "-",
+    ])
+    audio_task = run_ffmpeg(base + ["-map", "0:a:0?", "-vn", "-ac", "1", "-ar", str(AUDIO_RATE), "-f", "s16le", "-"])
+    video_raw, audio_raw = await asyncio.gather(video_task, audio_task, return_exceptions=True)
+    for raw in (video_raw, audio_raw):
+        # Cancellation is not a decode failure
+        if isinstance(raw, BaseException) and not isinstance(raw, Exception):
+            raise raw
+    if isinstance(video_raw, Exception):
+        logger.error(f"Fingerprinting failed: {video_raw}")
+        return None
+
+    gray = np.frombuffer(video_raw, dtype=np.uint8)
+    gray = gray[: len(gray) - len(gray) % (FRAME_SIZE * FRAME_SIZE)].reshape(-1, FRAME_SIZE, FRAME_SIZE)
+    if len(gray) == 0 or len(gray) > limit:
+        return None
+    samples = np.zeros(0, dtype=np.int16)
+    if not isinstance(audio_raw, Exception):
+        samples = np.frombuffer(audio_raw[: len(audio_raw) - len(audio_raw) % 2], dtype=np.int16)
+
+    # The hashing is pure NumPy; keep it off the event loop
+    return await asyncio.to_thread(
+        lambda: Fingerprint(frame_hashes(gray), gray.reshape(len(gray), -1).std(axis=1) < FLAT_FRAME_STD, audio_hashes(samples))
+    )
+
+class FingerprintIndex:
+    """Redis-backed banded index of fingerprints keyed by content SHA-256.
+
+    `fp:media:<sha256>` holds the compressed fingerprint; `fp:band:<i>:<value>`
+    sets map each 16-bit band of every indexed frame hash to the videos containing
+    it. Candidates are the videos sharing the most bands with the query, and are
+    then scored exactly.
+    """
+
+    MAX_CANDIDATES = 20
+    # Members sampled per band set; common bands (e.g. a shared intro) can hold many videos
+    MAX_BAND_MEMBERS = 64
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @staticmethod
+    def _band_keys(fingerprint: Fingerprint) -> List[str]:
+        keys = set()
+        for value in fingerprint.frames[~fingerprint.flat]:
+            for band in range(BANDS):
+                keys.add(f"fp:band:{band}:{(int(value) >> (band * BAND_BITS)) & 0xFFFF:04x}")
+        return sorted(keys)
+
+    async def add(self, file_hash: str, fingerprint: Fingerprint):
+        client = redis_service.client
+        if client is None:
+            return
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key in self._band_keys(fingerprint):
+                    pipe.sadd(key, file_hash)
+                    pipe.expire(key, self.ttl)
+                await pipe.execute()
+        except Exception as e:
+            logger.error(f"Fingerprint index error: {e}")
+            return
+        await redis_service.set_value(f"fp:media:{file_hash}", fingerprint.to_dict(), self.ttl)
+
+    async def find_similar(self, file_hash: str, fingerprint: Fingerprint, threshold: float) -> List[tuple]:
+        """Returns [(sha256, similarity)] at or above the threshold, most similar first."""
+        client = redis_service.client
+        keys = self._band_keys(fingerprint)
+        if client is None or not keys:
+            return []
+        try:
+            async with client.pipeline(transaction=False) as pipe:
+                for key in keys:
+                    pipe.srandmember(key, self.MAX_BAND_MEMBERS)
+                members = await pipe.execute()
+            votes: Dict[str, int] = {}
+            for group in members:
+                for candidate in group:
+                    if candidate != file_hash:
+                        votes[candidate] = votes.get(candidate, 0) + 1
+        except Exception as e:
+            logger.error(f"Fingerprint lookup error: {e}")
+            return []
+
+        candidates = sorted(votes, key=votes.get, reverse=True)[: self.MAX_CANDIDATES]
+        stored = await redis_service.get_values([f"fp:media:{candidate}" for candidate in candidates])
+
+        def score() -> List[tuple]:
+            matches = []
+            for candidate, data in zip(candidates, stored):
+                if data:
+                    value = similarity(fingerprint, Fingerprint.from_dict(data))
+                    if value >= threshold:
+                        matches.append((candidate, value))
+            return sorted(matches, key=lambda match: match[1], reverse=True)
+
+        # Exact scoring of long videos is CPU-heavy; keep it off the event loop
+        return await asyncio.to_thread(score)
+
+fingerprint_index = FingerprintIndex(ttl=settings.CACHE_TTL_SECONDS)
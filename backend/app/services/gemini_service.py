@@ -1,17 +1,42 @@
-from google import genai
 from app.core.config import settings
+from app.core.metrics import UPLOAD_BYTES, observe_stage, stage
+from app.services.quota_service import estimate_tokens, generate_scheduler, upload_scheduler
+from app.services.redis_service import redis_service
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Optional
+import asyncio
 import logging
+import os
 import time
 
 logger = logging.getLogger(__name__)
 
-# Initialize the Gemini Client
-client = genai.Client(api_key=settings.GEMINI_API_KEY)
+_client = None
+
+def get_client():
+    """Returns the shared Gemini client, creating it (and importing the SDK) on first use."""
+    global _client
+    if _client is None:
+        from google import genai
+        _client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    return _client
 
 # Use Gemini Flash Latest (Confirmed available via list_models)
 MODEL_NAME = "gemini-flash-latest"
 
-def upload_file(path_to_file: str, mime_type: str = None):
+# Gemini keeps uploaded files for 48 hours. Don't reuse a handle that could expire
+# before generation finishes with it.
+FILE_TTL_SECONDS = 48 * 3600
+FILE_REUSE_MARGIN_SECONDS = 15 * 60
+
+# Optional progress hook: awaited with a stage name ("uploaded", "processing", ...)
+StageCallback = Optional[Callable[[str], Awaitable[None]]]
+
+async def report_stage(on_stage: StageCallback, stage: str):
+    if on_stage:
+        await on_stage(stage)
+
+async def upload_file(path_to_file: str, mime_type: str = None):
     """Uploads a file to Gemini File API."""
     try:
         # configuration for upload
@@ -19,63 +44,154 @@ def upload_file(path_to_file: str, mime_type: str = None):
         if mime_type:
             config = {"mime_type": mime_type}
             
-        file = client.files.upload(file=path_to_file, config=config)
+        with stage("gemini_upload"):
+            file = await upload_scheduler.run(
+                lambda: get_client().aio.files.upload(file=path_to_file, config=config)
+            )
+        UPLOAD_BYTES.labels("gemini").inc(os.path.getsize(path_to_file))
         logger.info(f"Uploaded file '{file.display_name}' as: {file.uri}")
         return file
     except Exception as e:
         logger.error(f"Failed to upload file to Gemini: {str(e)}")
         raise Exception(f"Upload failed: {str(e)}")
 
-def wait_for_files_active(files):
+async def wait_for_files_active(files):
     """Waits for files to be processed by Gemini."""
     logger.info("Waiting for file processing...")
-    for file_obj in files:
-        file = client.files.get(name=file_obj.name)
-        start_time = time.time()
-        while file.state == "PROCESSING":
-            if time.time() - start_time > 300: # 5 minute timeout
-                raise Exception("File processing timed out")
-            time.sleep(0.75)
-            file = client.files.get(name=file_obj.name)
-        if file.state != "ACTIVE":
-            raise Exception(f"File {file.name} failed to process: {file.state}")
+    with stage("gemini_wait_active"):
+        for file_obj in files:
+            file = await get_client().aio.files.get(name=file_obj.name)
+            start_time = time.time()
+            while file.state == "PROCESSING":
+                if time.time() - start_time > 300: # 5 minute timeout
+                    raise Exception("File processing timed out")
+                # Yield to the event loop while Gemini processes the file
+                await asyncio.sleep(0.75)
+                file = await get_client().aio.files.get(name=file_obj.name)
+            if file.state != "ACTIVE":
+                raise Exception(f"File {file.name} failed to process: {file.state}")
     logger.info("File processing complete.")
 
-def analyze_multimodal(prompt: str, file_path: str = None, mime_type: str = None):
+def _seconds_until_expiry(file) -> float:
+    expiration = getattr(file, "expiration_time", None)
+    if not expiration:
+        return 0
+    if expiration.tzinfo is None:
+        expiration = expiration.replace(tzinfo=timezone.utc)
+    return (expiration - datetime.now(timezone.utc)).total_seconds()
+
+async def _get_reusable_file(file_hash: str):
+    """Returns a still-valid Gemini file previously uploaded for this hash, or None."""
+    file_name = await redis_service.get_file_handle(file_hash)
+    if not file_name:
+        return None
+    try:
+        file = await get_client().aio.files.get(name=file_name)
+    except Exception as e:
+        # Deleted or expired on Gemini's side
+        logger.info(f"Cached Gemini file {file_name} is gone, re-uploading: {str(e)}")
+        return None
+    if file.state not in ("ACTIVE", "PROCESSING"):
+        logger.info(f"Cached Gemini file {file_name} is {file.state}, re-uploading")
+        return None
+    if _seconds_until_expiry(file) < FILE_REUSE_MARGIN_SECONDS:
+        logger.info(f"Cached Gemini file {file_name} is about to expire, re-uploading")
+        return None
+    return file
+
+async def get_or_upload_file(
+    file_path: str,
+    file_hash: str = None,
+    mime_type: str = None,
+    on_stage: StageCallback = None,
+    preprocess: Optional[Callable[[str], Awaitable[str]]] = None,
+    unprocessed_hash: str = None,
+):
+    """Returns an ACTIVE Gemini file for the content, reusing an earlier upload of the same hash.
+
+    The same media checked for several platforms (or re-checked later) is uploaded
+    and processed once; the handle is only replaced after it expires. `preprocess`
+    maps the file to the path actually uploaded and only runs when an upload is needed.
+    When it returns the file unchanged, the handle is recorded under `unprocessed_hash`
+    instead, so `file_hash` only ever names preprocessed uploads.
     """
-    Analyzes content using Gemini 1.5 Flash.
-    Supports text-only or multimodal (video+text) analysis.
+    if file_hash:
+        started = time.perf_counter()
+        file = await _get_reusable_file(file_hash)
+        if file:
+            # A reused handle is recorded as a cache hit of the upload stage
+            observe_stage("gemini_upload", time.perf_counter() - started, cache_hit=True)
+            logger.info(f"Reusing Gemini file {file.name} for hash {file_hash[:12]}")
+            await report_stage(on_stage, "processing")
+            await wait_for_files_active([file])
+            return file
+
+    upload_path = file_path
+    if preprocess:
+        with stage("preprocess"):
+            upload_path = await preprocess(file_path)
+    try:
+        file = await upload_file(upload_path, mime_type=mime_type)
+    finally:
+        if upload_path != file_path and os.path.exists(upload_path):
+            os.remove(upload_path)
+    await report_stage(on_stage, "uploaded")
+    await report_stage(on_stage, "processing")
+    await wait_for_files_active([file])
+    if upload_path == file_path and unprocessed_hash:
+        file_hash = unprocessed_hash
+    if file_hash:
+        ttl = int((_seconds_until_expiry(file) or FILE_TTL_SECONDS) - FILE_REUSE_MARGIN_SECONDS)
+        if ttl > 0:
+            await redis_service.set_file_handle(file_hash, file.name, ttl)
+    return file
+
+# Define safety settings to be more permissive for analysis results
+# These are to prevent the model from blocking its OWN analysis output
+# when it describes "dangerous" content it found.
+SAFETY_SETTINGS = [
+    {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
+    {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
+]
+
+async def generate_analysis(
+    prompt: str,
+    files=None,
+    response_schema=None,
+    system_instruction: Optional[str] = None,
+    cached_content: Optional[str] = None,
+    cached_tokens: int = 0,
+):
+    """Runs one JSON-mode generation over the prompt and any already-active Gemini files.
+
+    `response_schema` (e.g. a pydantic model) constrains the JSON structure.
+    `cached_content` names a context cache holding the prompt prefix; pass its
+    size as `cached_tokens` so it still counts against the token budget.
     """
-    
-    contents = [prompt]
-    
-    if file_path:
-        try:
-            uploaded_file = upload_file(file_path, mime_type=mime_type)
-            wait_for_files_active([uploaded_file])
-            contents.append(uploaded_file)
-        except Exception as e:
-            raise Exception(f"Video processing error: {str(e)}")
-        
+    contents = [prompt, *(files or [])]
+    config = {
+        "safety_settings": SAFETY_SETTINGS,
+        "response_mime_type": "application/json"
+    }
+    if response_schema is not None:
+        config["response_schema"] = response_schema
+    if system_instruction:
+        config["system_instruction"] = system_instruction
+    if cached_content:
+        config["cached_content"] = cached_content
     try:
-        # Define safety settings to be more permissive for analysis results
-        # These are to prevent the model from blocking its OWN analysis output
-        # when it describes "dangerous" content it found.
-        safety_settings = [
-            {"category": "HARM_CATEGORY_HATE_SPEECH", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_HARASSMENT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_SEXUALLY_EXPLICIT", "threshold": "BLOCK_NONE"},
-            {"category": "HARM_CATEGORY_DANGEROUS_CONTENT", "threshold": "BLOCK_NONE"},
-        ]
-
-        response = client.models.generate_content(
-            model=MODEL_NAME,
-            contents=contents,
-            config={
-                "safety_settings": safety_settings,
-                "response_mime_type": "application/json"
-            }
-        )
+        # Queued behind the shared RPM/TPM budget and retried on 429 before giving up
+        with stage("gemini_generate"):
+            response = await generate_scheduler.run(
+                lambda: get_client().aio.models.generate_content(
+                    model=MODEL_NAME,
+                    contents=contents,
+                    config=config,
+                ),
+                tokens=estimate_tokens(f"{system_instruction or ''}{prompt}", len(files or [])) + cached_tokens,
+            )
         
         if not response.text:
             raise Exception("Gemini returned an empty response. This may be due to safety filters or model error.")
@@ -86,3 +202,20 @@ def analyze_multimodal(prompt: str, file_path: str = None, mime_type: str = None
         if "429" in str(e):
             raise Exception("Gemini API Quota exceeded. Please try again in a minute.")
         raise Exception(f"AI Model Error: {str(e)}")
+
+async def prepare_media(
+    file_path: str,
+    file_hash: str = None,
+    mime_type: str = None,
+    on_stage: StageCallback = None,
+    preprocess: Optional[Callable[[str], Awaitable[str]]] = None,
+    unprocessed_hash: str = None,
+):
+    """Uploads (or reuses) the media file, wrapping failures as video processing errors."""
+    try:
+        return await get_or_upload_file(
+            file_path, file_hash=file_hash, mime_type=mime_type, on_stage=on_stage,
+            preprocess=preprocess, unprocessed_hash=unprocessed_hash,
+        )
+    except Exception as e:
+        raise Exception(f"Video processing error: {str(e)}")
@@ -0,0 +1,95 @@
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+import fcntl
+import logging
+import os
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+CURRENT_FILENAME = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+LOCK_FILENAME = "ingest.lock"
+
+class IndexStore:
+    """Immutable, versioned index directories under one root, shared by several processes.
+
+    A version is built in its own directory and published by atomically
+    replacing the CURRENT file, so readers only ever see complete versions.
+    Building is serialized by an exclusive lock on a file in the root.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self.versions_dir = os.path.join(root, VERSIONS_DIRNAME)
+        self.current_path = os.path.join(root, CURRENT_FILENAME)
+        self.lock_path = os.path.join(root, LOCK_FILENAME)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.versions_dir, name)
+
+    def current(self) -> Optional[str]:
+        """Name of the published version, or None before the first one."""
+        try:
+            with open(self.current_path, "r") as f:
+                name = f.read().strip()
+        except FileNotFoundError:
+            return None
+        return name if name and os.path.isdir(self.path(name)) else None
+
+    def versions(self) -> List[str]:
+        if not os.path.isdir(self.versions_dir):
+            return []
+        # Names start with a UTC timestamp, so they sort oldest first
+        return sorted(name for name in os.listdir(self.versions_dir) if os.path.isdir(self.path(name)))
+
+    @contextmanager
+    def build_lock(self, wait: bool = False) -> Iterator[bool]:
+        """Holds the exclusive build lock for the block; yields False if another process has it.
+
+        The lock is released by the OS if the holder dies, so a crashed build never blocks the next.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.lock_path, "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def create_version(self, base: Optional[str] = None) -> str:
+        """Creates a new version directory, starting as a copy of `base` so ingestion is incremental.
+
+        Call with the build lock held.
+        """
+        name = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.getpid()}"
+        path = self.path(name)
+        if base:
+            shutil.copytree(self.path(base), path)
+        else:
+            os.makedirs(path)
+        return name
+
+    def publish(self, name: str, keep: int):
+        """Points CURRENT at the version, then removes all but the newest `keep` versions.
+
+        Older versions are kept briefly because other processes may still be reading them.
+        Call with the build lock held.
+        """
+        tmp_path = f"{self.current_path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.current_path)
+
+        # Unpublished directories left by crashed builds are older than `name` and go too
+        for old in self.versions()[:-max(1, keep)]:
+            if old != name:
+                shutil.rmtree(self.path(old), ignore_errors=True)
+                logger.info(f"Removed old RAG index version {old}")
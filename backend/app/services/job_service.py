@@ -0,0 +1,257 @@
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from app.core.config import settings
+from app.models.schemas import AnalyzeResponse
+from app.services.analysis_service import analyze_media, find_cached_analysis
+from app.services.quota_service import PRIORITY_BATCH, current_priority
+from app.services.redis_service import redis_service
+import asyncio
+import json
+import logging
+import os
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# queued -> uploaded -> processing -> retrieving -> generating -> completed | failed
+TERMINAL_STAGES = ("completed", "failed")
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+class InMemoryJobBackend:
+    """Process-local job store and queue, for tests and single-instance development."""
+
+    def __init__(self):
+        self._jobs: Dict[str, dict] = {}
+        self._queue: Optional[asyncio.Queue] = None
+
+    def _get_queue(self) -> asyncio.Queue:
+        # Created lazily so it binds to the running event loop
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        return self._queue
+
+    async def save(self, job: dict):
+        self._jobs[job["job_id"]] = dict(job)
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    async def enqueue(self, job_id: str):
+        await self._get_queue().put(job_id)
+
+    async def dequeue(self, consumer: str, timeout: float) -> Optional[str]:
+        try:
+            return await asyncio.wait_for(self._get_queue().get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def ack(self, consumer: str, job_id: str):
+        pass
+
+    async def heartbeat(self, consumers: List[str]):
+        pass
+
+class RedisJobBackend:
+    """Job records and queue in Redis, so any replica can report status and run work.
+
+    A worker moves each job it takes into its own processing list and removes it
+    when done. The processing lists of workers whose process stopped heartbeating
+    (a crash or redeploy) are moved back onto the queue by the surviving replicas.
+    """
+
+    QUEUE_KEY = "jobs:queue"
+    CONSUMERS_KEY = "jobs:consumers"
+    HEARTBEAT_TTL_SECONDS = 60
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+
+    @property
+    def client(self):
+        if not redis_service.client:
+            raise Exception("Redis is unavailable; cannot use the job queue")
+        return redis_service.client
+
+    async def save(self, job: dict):
+        await self.client.setex(f"job:{job['job_id']}", self.ttl, json.dumps(job))
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        data = await self.client.get(f"job:{job_id}")
+        return json.loads(data) if data else None
+
+    async def enqueue(self, job_id: str):
+        await self.client.lpush(self.QUEUE_KEY, job_id)
+
+    async def dequeue(self, consumer: str, timeout: float) -> Optional[str]:
+        return await self.client.blmove(
+            self.QUEUE_KEY, f"jobs:processing:{consumer}", max(1, int(timeout)), src="RIGHT", dest="LEFT"
+        )
+
+    async def ack(self, consumer: str, job_id: str):
+        await self.client.lrem(f"jobs:processing:{consumer}", 1, job_id)
+
+    async def heartbeat(self, consumers: List[str]):
+        """Marks these consumers alive, then re-queues jobs held by consumers that are not."""
+        client = self.client
+        async with client.pipeline(transaction=False) as pipe:
+            for consumer in consumers:
+                pipe.setex(f"jobs:alive:{consumer}", self.HEARTBEAT_TTL_SECONDS, "1")
+            pipe.sadd(self.CONSUMERS_KEY, *consumers)
+            await pipe.execute()
+
+        for consumer in await client.smembers(self.CONSUMERS_KEY):
+            if await client.exists(f"jobs:alive:{consumer}"):
+                continue
+            processing = f"jobs:processing:{consumer}"
+            # Back onto the consuming end of the queue, so recovered jobs run next
+            while (job_id := await client.lmove(processing, self.QUEUE_KEY, src="RIGHT", dest="RIGHT")) is not None:
+                logger.warning(f"Re-queued job {job_id} abandoned by worker {consumer}")
+            await client.srem(self.CONSUMERS_KEY, consumer)
+
+class JobService:
+    """Accepts analysis jobs and runs them on a pool of background workers.
+
+    Uploads are staged in JOB_STAGING_DIR; with the Redis backend and several
+    replicas that directory must be shared, since any replica may pick a job up.
+    """
+
+    HEARTBEAT_SECONDS = 15
+    MAX_BACKOFF_SECONDS = 30
+
+    def __init__(self, backend, workers: int = 2):
+        self.backend = backend
+        self.workers = workers
+        # Unique per process start, so a restarted process never owns its predecessor's jobs
+        self.consumer_prefix = f"{os.uname().nodename}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        if self._tasks:
+            return
+        logger.info(f"Starting {self.workers} analysis job workers ({type(self.backend).__name__})")
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._heartbeat()))
+
+    def _consumer(self, worker_id: int) -> str:
+        return f"{self.consumer_prefix}:{worker_id}"
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, platform: str, file_path: Optional[str], file_hash: str) -> dict:
+        """Records a job and queues it, or completes it immediately on a cache hit."""
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "platform": platform,
+            "file_hash": file_hash,
+            "file_path": file_path,
+            "stage": "queued",
+            "error": None,
+            "result": None,
+            "created_at": _now(),
+            "updated_at": _now(),
+        }
+        cached = await find_cached_analysis(platform, file_hash)
+        if cached:
+            job.update(stage="completed", result=cached, file_path=None)
+            await self.backend.save(job)
+            self._remove_staged(file_path)
+            return job
+
+        await self.backend.save(job)
+        await self.backend.enqueue(job["job_id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        return await self.backend.get(job_id)
+
+    async def _update(self, job: dict, **fields):
+        job.update(fields, updated_at=_now())
+        await self.backend.save(job)
+
+    async def _heartbeat(self):
+        """Keeps this process's workers marked alive and recovers jobs of dead ones (first run at startup)."""
+        consumers = [self._consumer(i) for i in range(self.workers)]
+        while True:
+            try:
+                await self.backend.heartbeat(consumers)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job heartbeat error: {e}")
+            await asyncio.sleep(self.HEARTBEAT_SECONDS)
+
+    async def _worker(self, worker_id: int):
+        # Queued jobs yield Gemini capacity to interactive requests
+        current_priority.set(PRIORITY_BATCH)
+        consumer = self._consumer(worker_id)
+        backoff = 0
+        while True:
+            try:
+                job_id = await self.backend.dequeue(consumer, timeout=5)
+                if backoff:
+                    logger.info(f"Job worker {worker_id} reconnected")
+                    backoff = 0
+                if job_id:
+                    # A cancelled run (shutdown, redeploy) stays unacknowledged and is re-queued
+                    try:
+                        await self._run(job_id)
+                    except Exception:
+                        await self.backend.ack(consumer, job_id)
+                        raise
+                    await self.backend.ack(consumer, job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Back off while the queue is unreachable instead of retrying every second
+                if not backoff:
+                    logger.error(f"Job worker {worker_id} error: {e}")
+                backoff = min(self.MAX_BACKOFF_SECONDS, backoff * 2 or 1)
+                await asyncio.sleep(backoff)
+
+    async def _run(self, job_id: str):
+        job = await self.backend.get(job_id)
+        if not job or job["stage"] in TERMINAL_STAGES:
+            return
+
+        async def on_stage(stage: str):
+            await self._update(job, stage=stage)
+
+        platform = job["platform"]
+        requeued = False
+        try:
+            outcome = (await analyze_media([platform], job["file_path"], job["file_hash"], on_stage=on_stage))[platform]
+            if isinstance(outcome, Exception):
+                raise outcome
+            await self._update(job, stage="completed", result=outcome.model_dump())
+        except asyncio.CancelledError:
+            # Left unacknowledged, so the job is re-queued; keep its staged upload
+            requeued = True
+            raise
+        except Exception as e:
+            logger.error(f"Job {job_id} failed: {e}")
+            await self._update(job, stage="failed", error=str(e))
+        finally:
+            if not requeued:
+                self._remove_staged(job.get("file_path"))
+
+    @staticmethod
+    def _remove_staged(file_path: Optional[str]):
+        if file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+def job_result(job: dict) -> Optional[AnalyzeResponse]:
+    return AnalyzeResponse(**job["result"]) if job.get("result") else None
+
+def _create_backend():
+    if settings.JOB_BACKEND == "memory":
+        return InMemoryJobBackend()
+    return RedisJobBackend(ttl=settings.JOB_TTL_SECONDS)
+
+job_service = JobService(_create_backend(), workers=settings.JOB_WORKERS)
@@ -0,0 +1,97 @@
+import json
+import logging
+import math
+import os
+import re
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+BM25_FILENAME = "bm25_index.json"
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were what "
+    "which will with you your our we they not no can may do does".split()
+)
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN_RE.findall(text.lower()) if token not in _STOPWORDS]
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuses ranked id lists: score(id) = sum over lists of 1 / (k + rank)."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+class BM25Index:
+    """Okapi BM25 over the policy chunks, held in memory and persisted as JSON.
+
+    Built from the same chunks (and ids) as the Chroma collection, so its
+    results can be fused with vector results by id. Searching makes no
+    network calls.
+    """
+
+    def __init__(self, chunks: List[dict], source: str = "", k1: float = 1.5, b: float = 0.75):
+        # chunks: [{"id", "text", "metadata"}]
+        self.chunks = chunks
+        self.source = source
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        for position, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk["text"]))
+            self._lengths.append(sum(counts.values()))
+            for token, count in counts.items():
+                self._postings.setdefault(token, []).append((position, count))
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def __len__(self):
+        return len(self.chunks)
+
+    def search(self, query: str, platforms: Optional[Iterable[str]] = None, top_k: int = 5) -> List[Tuple[dict, float]]:
+        """Returns [(chunk, score)] best first, optionally restricted to chunks of the given platforms."""
+        allowed = set(platforms) if platforms else None
+        total = len(self.chunks)
+        scores: Dict[int, float] = {}
+        for token in set(tokenize(query)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[position] / (self._average_length or 1))
+                scores[position] = scores.get(position, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        results = []
+        for position, score in ranked:
+            chunk = self.chunks[position]
+            if allowed is None or chunk["metadata"].get("platform") in allowed:
+                results.append((chunk, score))
+                if len(results) == top_k:
+                    break
+        return results
+
+    def save(self, path: str):
+        """Writes atomically so readers never see a half-written index."""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"source": self.source, "chunks": self.chunks}, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["BM25Index"]:
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            return cls(data["chunks"], source=data.get("source", ""))
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"BM25 index is unreadable, it will be rebuilt: {str(e)}")
+            return None
@@ -0,0 +1,159 @@
+from typing import Dict, List, Optional, Tuple
+from app.core.config import settings
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+ORIGINAL_PROFILE = "original"
+
+# Analysis profiles: what we send to Gemini instead of the raw upload. Gemini
+# samples video at ~1 fps and only needs intelligible speech, so high resolution,
+# frame rate, bitrate and stereo/48 kHz audio just cost upload bytes and processing time.
+MEDIA_PROFILES: Dict[str, dict] = {
+    "analysis-720p": {"max_height": 720, "fps": 15, "video_bitrate": "1M", "audio_rate": 16000, "audio_bitrate": "32k"},
+    "analysis-480p": {"max_height": 480, "fps": 10, "video_bitrate": "500k", "audio_rate": 16000, "audio_bitrate": "24k"},
+}
+
+# ffprobe takes milliseconds; it gets its own small pool instead of queueing behind transcodes
+PROBE_MAX_PROCESSES = 8
+
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+def _get_semaphore(pool: str) -> asyncio.Semaphore:
+    # Bounds concurrent ffmpeg processes per pool; created lazily to bind to the running loop
+    if pool not in _semaphores:
+        _semaphores[pool] = asyncio.Semaphore(PROBE_MAX_PROCESSES if pool == "probe" else settings.MEDIA_MAX_PROCESSES)
+    return _semaphores[pool]
+
+def active_profile() -> str:
+    """Returns the configured profile id, or "original" when preprocessing can't run."""
+    profile = settings.MEDIA_PROFILE
+    if profile == ORIGINAL_PROFILE:
+        return ORIGINAL_PROFILE
+    if profile not in MEDIA_PROFILES:
+        logger.warning(f"Unknown MEDIA_PROFILE '{profile}', uploading originals")
+        return ORIGINAL_PROFILE
+    if not shutil.which("ffmpeg"):
+        return ORIGINAL_PROFILE
+    return profile
+
+def _transcode_args(input_path: str, output_path: str, profile: dict) -> list:
+    return [
+        "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+        "-i", input_path,
+        "-map", "0:v:0", "-map", "0:a:0?",
+        # Never upscale; -2 keeps the width even for libx264
+        "-vf", f"scale=-2:'min({profile['max_height']},ih)',fps={profile['fps']}",
+        "-c:v", "libx264", "-preset", "veryfast",
+        "-b:v", profile["video_bitrate"], "-maxrate", profile["video_bitrate"], "-bufsize", "2M",
+        "-c:a", "aac", "-ac", "1", "-ar", str(profile["audio_rate"]), "-b:a", profile["audio_bitrate"],
+        "-movflags", "+faststart",
+        output_path,
+    ]
+
+async def run_ffmpeg(args: list, timeout: Optional[int] = None, pool: str = "transcode") -> bytes:
+    """Runs an ffmpeg/ffprobe command in a bounded subprocess pool ("transcode" or "probe") and returns its stdout."""
+    async with _get_semaphore(pool):
+        process = await asyncio.create_subprocess_exec(
+            *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+        )
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                process.communicate(), timeout or settings.MEDIA_TIMEOUT_SECONDS
+            )
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise Exception(f"{args[0]} timed out")
+        if process.returncode != 0:
+            raise Exception(f"{args[0]} failed: {stderr.decode(errors='ignore').strip()[-500:]}")
+        return stdout
+
+async def preprocess_media(file_path: str, profile: Optional[str] = None) -> str:
+    """Transcodes the upload to the analysis profile and returns the path to upload.
+
+    Returns `file_path` itself when the profile is "original", ffmpeg fails, or the
+    transcode isn't smaller. Otherwise the caller owns (and must delete) the new file.
+    """
+    profile = profile or active_profile()
+    if profile == ORIGINAL_PROFILE:
+        return file_path
+
+    fd, output_path = tempfile.mkstemp(suffix=".mp4", dir=os.path.dirname(file_path))
+    os.close(fd)
+    try:
+        await run_ffmpeg(_transcode_args(file_path, output_path, MEDIA_PROFILES[profile]))
+        original_size = os.path.getsize(file_path)
+        output_size = os.path.getsize(output_path)
+        if output_size == 0 or output_size >= original_size:
+            logger.info(f"Transcode to {profile} saved nothing ({original_size} -> {output_size} bytes); uploading original")
+            os.remove(output_path)
+            return file_path
+        logger.info(f"Transcoded to {profile}: {original_size} -> {output_size} bytes")
+        return output_path
+    except Exception as e:
+        logger.error(f"Media preprocessing failed, uploading original: {str(e)}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        return file_path
+
+async def probe_duration(file_path: str) -> Optional[float]:
+    """Returns the media duration in seconds, or None if ffprobe can't tell."""
+    if not shutil.which("ffprobe"):
+        return None
+    try:
+        stdout = await run_ffmpeg([
+            "ffprobe", "-v", "error", "-show_entries", "format=duration",
+            "-of", "default=noprint_wrappers=1:nokey=1", file_path,
+        ], timeout=60, pool="probe")
+        return float(stdout.decode().strip())
+    except Exception as e:
+        logger.error(f"Could not probe media duration: {str(e)}")
+        return None
+
+async def split_segments(file_path: str, duration: float, segment_seconds: int, overlap_seconds: int) -> List[Tuple[float, float, str]]:
+    """Cuts the media into overlapping segments without re-encoding.
+
+    Returns (start, end, path) per segment; the caller deletes the files. Stream
+    copy cuts on keyframes, so a segment may begin slightly before `start`; the
+    overlap keeps events near a boundary inside at least one segment.
+    """
+    step = max(1, segment_seconds - overlap_seconds)
+    starts = []
+    start = 0.0
+    while start < duration:
+        starts.append(start)
+        if start + segment_seconds >= duration:
+            break
+        start += step
+
+    suffix = os.path.splitext(file_path)[1] or ".mp4"
+    segments = []
+    try:
+        for start in starts:
+            end = min(duration, start + segment_seconds)
+            fd, output_path = tempfile.mkstemp(suffix=suffix, dir=os.path.dirname(file_path))
+            os.close(fd)
+            segments.append((start, end, output_path))
+        await asyncio.gather(*(
+            run_ffmpeg([
+                "ffmpeg", "-nostdin", "-hide_banner", "-loglevel", "error", "-y",
+                "-ss", f"{start:.3f}", "-i", file_path, "-t", f"{end - start:.3f}",
+                "-map", "0", "-c", "copy", "-avoid_negative_ts", "make_zero",
+                output_path,
+            ])
+            for start, end, output_path in segments
+        ))
+    except Exception:
+        remove_files([path for _, _, path in segments])
+        raise
+    return segments
+
+def remove_files(paths: List[str]):
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
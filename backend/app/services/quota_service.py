@@ -0,0 +1,302 @@
+from contextvars import ContextVar
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
+from app.core.config import settings
+from app.core.metrics import GEMINI_ERRORS, GEMINI_RETRIES, QUOTA_WAIT_SECONDS
+from app.services.redis_service import redis_service
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Lower runs first. Interactive requests jump ahead of queued jobs and ingestion.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+PRIORITY_INGEST = 2
+
+# Priority of Gemini calls made by the current task; job workers and ingestion override it
+current_priority: ContextVar[int] = ContextVar("gemini_priority", default=PRIORITY_INTERACTIVE)
+
+def error_kind(e: Exception) -> str:
+    """Classifies a Gemini error as rate_limited (429), unavailable (503) or other."""
+    message = str(e)
+    if any(marker in message for marker in ("429", "RESOURCE_EXHAUSTED", "Resource exhausted")):
+        return "rate_limited"
+    if any(marker in message for marker in ("503", "UNAVAILABLE")):
+        return "unavailable"
+    return "other"
+
+def is_retryable_error(e: Exception) -> bool:
+    return error_kind(e) != "other"
+
+# Two token buckets (requests and tokens per minute) checked and debited together.
+# Returns the seconds to wait before the cost fits, or "0" once it has been debited.
+_TAKE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local wait = 0
+local levels = {}
+for i = 1, 2 do
+    local capacity = tonumber(ARGV[2 * i])
+    local cost = tonumber(ARGV[2 * i + 1])
+    if capacity > 0 then
+        local state = redis.call('HMGET', KEYS[i], 'level', 'ts')
+        local level = tonumber(state[1]) or capacity
+        local ts = tonumber(state[2]) or now
+        local rate = capacity / 60
+        level = math.min(capacity, level + math.max(0, now - ts) * rate)
+        levels[i] = level
+        if level < cost then
+            wait = math.max(wait, (cost - level) / rate)
+        end
+    end
+end
+for i = 1, 2 do
+    if levels[i] then
+        local cost = tonumber(ARGV[2 * i + 1])
+        local level = levels[i]
+        if wait == 0 then level = level - cost end
+        redis.call('HSET', KEYS[i], 'level', tostring(level), 'ts', ARGV[1])
+        redis.call('EXPIRE', KEYS[i], 120)
+    end
+end
+return tostring(wait)
+"""
+
+_shared_loop: Optional[asyncio.AbstractEventLoop] = None
+
+def bind_event_loop():
+    """Makes the running loop the server's: calls made on other loops are admitted on it."""
+    global _shared_loop
+    _shared_loop = asyncio.get_running_loop()
+
+def _foreign_loop() -> Optional[asyncio.AbstractEventLoop]:
+    """The server's loop, when called from a different loop (e.g. ingestion's worker thread)."""
+    loop = _shared_loop
+    if loop is None or loop is asyncio.get_running_loop() or loop.is_closed() or not loop.is_running():
+        return None
+    return loop
+
+class _LocalBuckets:
+    """Process-local version of _TAKE_SCRIPT, used without Redis."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state: Dict[str, Tuple[float, float]] = {}
+
+    def take(self, limits: List[Tuple[str, int, int]]) -> float:
+        now = time.time()
+        with self._lock:
+            wait = 0.0
+            levels = {}
+            for key, capacity, cost in limits:
+                if capacity <= 0:
+                    continue
+                level, ts = self._state.get(key, (capacity, now))
+                rate = capacity / 60
+                level = min(capacity, level + max(0.0, now - ts) * rate)
+                levels[key] = (level, cost)
+                if level < cost:
+                    wait = max(wait, (cost - level) / rate)
+            for key, (level, cost) in levels.items():
+                self._state[key] = (level - cost if wait == 0 else level, now)
+            return wait
+
+class _LoopState:
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.waiting: List[Tuple[int, int]] = []
+        self.active = 0
+
+class QuotaScheduler:
+    """Admission control for one Gemini resource: RPM and TPM token buckets plus a concurrency cap.
+
+    Callers queue by priority; only the head of the queue may take budget, so
+    interactive work is never starved by a backlog of jobs or ingestion. Calls
+    made on another event loop (ingestion runs asyncio.run in a worker thread)
+    are admitted on the server's loop, so they join the same queue, concurrency
+    cap and budget. The buckets live in Redis (shared by every replica) when it
+    is up, and in process otherwise. Without a server loop (one-off scripts)
+    each loop queues on its own. run() also retries rate-limit and overload
+    errors with jittered exponential backoff.
+    """
+
+    def __init__(self, name: str, rpm: int = 0, tpm: int = 0, max_concurrency: int = 0, max_retries: int = 4):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.stats = {"admitted": 0, "throttled": 0, "retried": 0}
+        self._sequence = itertools.count()
+        self._local = _LocalBuckets()
+        self._loops: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+
+    def _state(self) -> _LoopState:
+        # asyncio primitives bind to one loop; scripts without a server loop run their own
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            state = self._loops[loop] = _LoopState()
+        return state
+
+    def _limits(self, tokens: int) -> List[Tuple[str, int, int]]:
+        return [
+            (f"quota:{self.name}:rpm", self.rpm, min(1, self.rpm) if self.rpm else 0),
+            (f"quota:{self.name}:tpm", self.tpm, min(tokens, self.tpm) if self.tpm else 0),
+        ]
+
+    async def _take(self, tokens: int) -> float:
+        limits = self._limits(tokens)
+        if not any(capacity for _, capacity, _ in limits):
+            return 0.0
+        # The shared Redis client's connections belong to the server's loop; loops
+        # started elsewhere without one (scripts) stay local
+        global _shared_loop
+        loop = asyncio.get_running_loop()
+        if _shared_loop is None and threading.current_thread() is threading.main_thread():
+            _shared_loop = loop
+        if loop is _shared_loop:
+            args = [time.time()]
+            for _, capacity, cost in limits:
+                args += [capacity, cost]
+            wait = await redis_service.eval_script(_TAKE_SCRIPT, [key for key, _, _ in limits], args)
+            if wait is not None:
+                return float(wait)
+        # Without Redis each replica enforces the full budget on its own
+        return self._local.take(limits)
+
+    @staticmethod
+    def _dequeue(state: _LoopState, entry: Tuple[int, int]):
+        """Removes this caller's own entry, wherever it now sits in the queue."""
+        if entry in state.waiting:
+            state.waiting.remove(entry)
+            heapq.heapify(state.waiting)
+
+    async def _acquire(self, priority: int, tokens: int):
+        state = self._state()
+        entry = (priority, next(self._sequence))
+        heapq.heappush(state.waiting, entry)
+        queued_at = time.monotonic()
+        deadline = time.monotonic() + settings.QUOTA_MAX_WAIT_SECONDS
+        try:
+            while True:
+                async with state.condition:
+                    await asyncio.wait_for(
+                        state.condition.wait_for(
+                            lambda: state.waiting[0] == entry
+                            and (not self.max_concurrency or state.active < self.max_concurrency)
+                        ),
+                        max(0.0, deadline - time.monotonic()),
+                    )
+                wait = await self._take(tokens)
+                if wait <= 0:
+                    break
+                self.stats["throttled"] += 1
+                if time.monotonic() + wait > deadline:
+                    raise asyncio.TimeoutError()
+                # Stay at the head of the queue while the bucket refills
+                await asyncio.sleep(wait)
+        except BaseException as e:
+            async with state.condition:
+                self._dequeue(state, entry)
+                state.condition.notify_all()
+            if isinstance(e, asyncio.TimeoutError):
+                raise Exception(f"Gemini {self.name} capacity is saturated; try again shortly")
+            raise
+
+        async with state.condition:
+            # A higher-priority caller may have queued ahead while this one was taking budget
+            self._dequeue(state, entry)
+            state.active += 1
+            self.stats["admitted"] += 1
+            state.condition.notify_all()
+        QUOTA_WAIT_SECONDS.labels(self.name).observe(time.monotonic() - queued_at)
+
+    async def _release(self):
+        state = self._state()
+        async with state.condition:
+            state.active -= 1
+            state.condition.notify_all()
+
+    async def admit(self, fn: Callable[[], Awaitable[T]], priority: Optional[int] = None, tokens: int = 0) -> T:
+        """Runs `fn` once it is admitted, without retrying."""
+        priority = current_priority.get() if priority is None else priority
+        loop = _foreign_loop()
+        if loop is not None:
+            # Queue on the server's loop; `fn` runs there too, and cancelling here cancels it there
+            return await asyncio.wrap_future(
+                asyncio.run_coroutine_threadsafe(self.admit(fn, priority=priority, tokens=tokens), loop)
+            )
+        await self._acquire(priority, tokens)
+        try:
+            return await fn()
+        finally:
+            await self._release()
+
+    async def run(self, fn: Callable[[], Awaitable[T]], priority: Optional[int] = None, tokens: int = 0) -> T:
+        """Runs `fn` under admission control, retrying rate-limit/overload errors with jittered backoff."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await self.admit(fn, priority=priority, tokens=tokens)
+            except Exception as e:
+                GEMINI_ERRORS.labels(self.name, error_kind(e)).inc()
+                if not is_retryable_error(e) or attempt == self.max_retries:
+                    raise
+                self.stats["retried"] += 1
+                GEMINI_RETRIES.labels(self.name).inc()
+                delay = min(settings.QUOTA_MAX_BACKOFF_SECONDS, settings.QUOTA_BACKOFF_SECONDS * 2 ** attempt)
+                # Full jitter so replicas that were throttled together don't retry together
+                delay = random.uniform(delay / 2, delay)
+                logger.warning(f"Gemini {self.name} call throttled ({str(e)[:80]}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def snapshot(self) -> dict:
+        return {
+            **self.stats,
+            "active": sum(state.active for state in self._loops.values()),
+            "waiting": sum(len(state.waiting) for state in self._loops.values()),
+        }
+
+_TOKEN_PIECE_RE = re.compile(r"[^\W\d_]+|\d|[^\w\s]|_")
+
+def count_tokens(text: str) -> int:
+    """Local approximation of Gemini's tokenizer: one token per ~6 letters of a word, per digit and per symbol.
+
+    Whitespace is free, unlike a characters/4 estimate, so indented prompts aren't overcounted.
+    """
+    return sum((len(piece) + 5) // 6 if piece[0].isalpha() else 1 for piece in _TOKEN_PIECE_RE.findall(text))
+
+def estimate_tokens(text: str, files: int = 0) -> int:
+    """Input size for the TPM budget: the text's local token count plus a flat estimate per media file."""
+    return count_tokens(text) + files * settings.QUOTA_FILE_TOKEN_ESTIMATE
+
+generate_scheduler = QuotaScheduler(
+    "generate",
+    rpm=settings.QUOTA_GENERATE_RPM,
+    tpm=settings.QUOTA_GENERATE_TPM,
+    max_concurrency=settings.QUOTA_GENERATE_CONCURRENCY,
+    max_retries=settings.QUOTA_MAX_RETRIES,
+)
+upload_scheduler = QuotaScheduler(
+    "upload",
+    rpm=settings.QUOTA_UPLOAD_RPM,
+    max_concurrency=settings.QUOTA_UPLOAD_CONCURRENCY,
+    max_retries=settings.QUOTA_MAX_RETRIES,
+)
+embed_scheduler = QuotaScheduler(
+    "embed",
+    rpm=settings.EMBED_REQUESTS_PER_MINUTE,
+    max_concurrency=settings.EMBED_MAX_CONCURRENCY,
+    max_retries=settings.EMBED_MAX_RETRIES,
+)
+
+def quota_stats() -> dict:
+    return {scheduler.name: scheduler.snapshot() for scheduler in (generate_scheduler, upload_scheduler, embed_scheduler)}
@@ -1,114 +1,532 @@
 import os
+import asyncio
+import hashlib
+import json
 import logging
-from typing import List, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from app.core.config import settings
-import google.generativeai as genai
-
-# CRITICAL: Configure API key for the underlying library
-if settings.GEMINI_API_KEY:
-    os.environ["GOOGLE_API_KEY"] = settings.GEMINI_API_KEY
-    genai.configure(api_key=settings.GEMINI_API_KEY)
-
-import chromadb
-from llama_index.core import (
-    VectorStoreIndex,
-    SimpleDirectoryReader,
-    StorageContext,
-    Settings,
-)
-from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.embeddings.gemini import GeminiEmbedding
-from llama_index.llms.gemini import Gemini
+from app.core.metrics import RAG_CHUNKS, stage
+from app.services.index_store import IndexStore
+from app.services.lexical_index import BM25_FILENAME, BM25Index, reciprocal_rank_fusion
+from app.services.prompt_service import ContextChunk, assemble_context, context_budget
+from app.services.quota_service import embed_scheduler
+
+if TYPE_CHECKING:
+    from llama_index.core.schema import NodeWithScore
 
 logger = logging.getLogger(__name__)
 
-# Configure LlamaIndex to use Gemini
-embed_model = GeminiEmbedding(
-    model_name="models/embedding-001", api_key=settings.GEMINI_API_KEY
-)
-Settings.embed_model = embed_model
-Settings.llm = Gemini(model="models/gemini-flash-latest", api_key=settings.GEMINI_API_KEY)
+_llama_index_configured = False
+_llm_configured = False
+
+def _configure_llama_index():
+    """Imports the Gemini/llama_index stack on first use and points it at Gemini embeddings.
+
+    These imports take seconds and must not run while the API module is imported.
+    """
+    global _llama_index_configured
+    if _llama_index_configured:
+        return
+    import google.generativeai as genai
+    from llama_index.core import Settings
+    from llama_index.embeddings.gemini import GeminiEmbedding
+
+    # CRITICAL: Configure API key for the underlying library
+    if settings.GEMINI_API_KEY:
+        os.environ["GOOGLE_API_KEY"] = settings.GEMINI_API_KEY
+        genai.configure(api_key=settings.GEMINI_API_KEY)
+
+    Settings.embed_model = GeminiEmbedding(
+        model_name="models/embedding-001", api_key=settings.GEMINI_API_KEY
+    )
+    _llama_index_configured = True
+
+def _configure_llm():
+    """Sets the synthesis LLM, which only the query() path needs."""
+    global _llm_configured
+    if _llm_configured:
+        return
+    from llama_index.core import Settings
+    from llama_index.llms.gemini import Gemini
+
+    Settings.llm = Gemini(model="models/gemini-flash-latest", api_key=settings.GEMINI_API_KEY)
+    _llm_configured = True
+
+# llama_index and Chroma are synchronous; run their calls on a bounded pool so
+# async endpoints never block the event loop on embeddings or synthesis.
+_executor = ThreadPoolExecutor(max_workers=settings.RAG_MAX_WORKERS, thread_name_prefix="rag")
+# Vector searches run here so a slow embedding call can be abandoned for lexical results
+_vector_executor = ThreadPoolExecutor(max_workers=settings.RAG_MAX_WORKERS, thread_name_prefix="rag-vector")
+
+RETRIEVAL_MODES = ("vector", "lexical", "hybrid")
+RRF_K = 60
+
+# The /analyze pipeline always asks the same question, so its answer only
+# changes when the index does. Platforms match the frontend's PlatformSelector ids.
+POLICY_CONTEXT_QUERY = "What are the core community guidelines and safety policies?"
+# Chunks retrieved for the policy context; the token budget decides how many are used
+POLICY_CONTEXT_CANDIDATES = 8
+SUPPORTED_PLATFORMS = ["youtube", "tiktok", "instagram", "twitter"]
+
+# Policy PDFs are named "<Title>.<Platform>.pdf" (see policy_docs/README.md).
+# Documents without a recognised suffix are tagged "general" and apply to every platform.
+GENERAL_PLATFORM = "general"
+PLATFORM_FILE_SUFFIXES = {
+    "(x)twitter": "twitter",
+    "instagram": "instagram",
+    "tiktok": "tiktok",
+    "youtube": "youtube",
+}
+PLATFORM_ALIASES = {"x": "twitter"}
+
+def normalize_platform(platform: str) -> str:
+    """Maps a request platform id (e.g. "X", "TikTok") onto the metadata value used at ingest."""
+    key = platform.strip().lower()
+    return PLATFORM_ALIASES.get(key, key)
+
+def platform_from_filename(file_name: str) -> str:
+    """Extracts the platform from a policy file name, e.g. "Spam.Instagram.pdf.pdf" -> "instagram"."""
+    stem = file_name.lower()
+    while stem.endswith(".pdf"):
+        stem = stem[:-4]
+    suffix = stem.rsplit(".", 1)[-1] if "." in stem else ""
+    return PLATFORM_FILE_SUFFIXES.get(suffix, GENERAL_PLATFORM)
+
+MANIFEST_FILENAME = "ingest_manifest.json"
+EMBEDDING_CACHE_FILENAME = "embedding_cache.sqlite3"
+# Policy context computed by the process that built a shared index version
+POLICY_CONTEXT_FILENAME = "policy_context.json"
+
+def _file_sha256(path: str) -> str:
+    sha256_hash = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1024 * 1024):
+            sha256_hash.update(chunk)
+    return sha256_hash.hexdigest()
+
+def policy_file_metadata(file_path: str) -> dict:
+    """SimpleDirectoryReader metadata hook that adds a filterable `platform` field."""
+    from llama_index.core.readers.file.base import default_file_metadata_func
+
+    metadata = default_file_metadata_func(file_path)
+    metadata["platform"] = platform_from_filename(os.path.basename(file_path))
+    return metadata
 
 class RAGService:
     def __init__(self, persist_dir: Optional[str] = None, data_dir: Optional[str] = None):
         # Default to paths relative to the backend directory
         backend_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
         
-        self.persist_dir = persist_dir or os.path.join(backend_dir, "chroma_db")
+        self.root_dir = persist_dir or settings.RAG_PERSIST_DIR or os.path.join(backend_dir, "chroma_db")
         self.data_dir = data_dir or os.path.join(backend_dir, "policy_docs")
+        # In shared mode the index lives in versioned subdirectories of root_dir
+        self.store = IndexStore(self.root_dir) if settings.RAG_SHARED_INDEX else None
+        # Name of the shared version being served
+        self.version: Optional[str] = None
+        self._use_dir(self.root_dir)
         
-        logger.info(f"RAG Service initializing with persist_dir: {self.persist_dir} and data_dir: {self.data_dir}")
-        
+        self.client = None
+        self.chroma_collection = None
+        self.vector_store = None
+        self.storage_context = None
+        self.embedding_pipeline = None
+        self.index = None
+        self.lexical_index: Optional[BM25Index] = None
+        # not_started -> starting -> ready | failed; see initialize()
+        self.status = "not_started"
+        # Bumped whenever the index is (re)built; cached policy context is tagged with it
+        self.index_version = 0
+        self._policy_context_cache: Dict[str, Tuple[int, str]] = {}
+        self._policy_context_locks: Dict[str, asyncio.Lock] = {}
+        self._startup_task: Optional[asyncio.Task] = None
+        # Serializes loading the BM25 index against switching to another shared version
+        self._open_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        # A shared-mode reader is ready once it has a version; it never opens Chroma
+        return self.index is not None or self.version is not None
+
+    @property
+    def is_shared_reader(self) -> bool:
+        """Serving a shared version this process didn't build: published context plus BM25 only.
+
+        Only the builder writes a version's Chroma directory, and Chroma has no
+        read-only client, so readers leave it alone.
+        """
+        return self.index is None and self.version is not None
+
+    def _use_dir(self, path: str):
+        """Points the index files at `path`: root_dir, or a version directory in shared mode."""
+        self.persist_dir = path
+        # Per-file content hashes of everything currently in the index
+        self.manifest_path = os.path.join(path, MANIFEST_FILENAME)
+        self.lexical_path = os.path.join(path, BM25_FILENAME)
+
+    def initialize(self, wait_for_lock: bool = False):
+        """Opens the vector store and syncs the index. Blocking; the API runs it via start()."""
+        self.status = "starting"
+        logger.info(f"RAG Service initializing with persist_dir: {self.root_dir} and data_dir: {self.data_dir}")
+        try:
+            _configure_llama_index()
+            if self.store is None:
+                # The lexical index needs neither Chroma nor Gemini, so load it first
+                self.lexical_index = self.lexical_index or BM25Index.load(self.lexical_path)
+                self._open_storage()
+                self._initialize_index()
+            else:
+                self._initialize_shared(wait_for_lock)
+        except Exception as e:
+            logger.error(f"Failed to start RAG service: {str(e)}")
+            self.index = None
+        self.status = "ready" if self.ready else "failed"
+
+    def _open_storage(self):
+        """Opens Chroma and the embedding pipeline used for ingestion."""
+        import chromadb
+        from llama_index.core import Settings
+        from app.services.embedding_pipeline import EmbeddingCache, EmbeddingPipeline
+
         self.client = chromadb.PersistentClient(path=self.persist_dir)
+        self._open_collection()
+        self.embedding_pipeline = EmbeddingPipeline(
+            Settings.embed_model,
+            # Shared by every index version, so a rebuild re-embeds only changed text
+            cache=EmbeddingCache(
+                settings.EMBEDDING_CACHE_PATH or os.path.join(self.root_dir, EMBEDDING_CACHE_FILENAME)
+            ),
+            batch_size=settings.EMBED_BATCH_SIZE,
+            requests_per_minute=settings.EMBED_REQUESTS_PER_MINUTE,
+            max_concurrency=settings.EMBED_MAX_CONCURRENCY,
+            max_retries=settings.EMBED_MAX_RETRIES,
+            scheduler=embed_scheduler,
+        )
+
+    def _initialize_shared(self, wait_for_lock: bool = False):
+        """Builds a new version if policy_docs changed and no one else is building, then serves the current one."""
+        if settings.RAG_INGEST:
+            with self.store.build_lock(wait=wait_for_lock) as acquired:
+                if acquired:
+                    try:
+                        self._build_version()
+                    except Exception as e:
+                        # Keep serving the last good version, if there is one
+                        logger.error(f"Failed to build a new RAG index version: {str(e)}")
+                else:
+                    logger.info("Another process is building the RAG index; serving the published version.")
+        name = self.store.current()
+        if name is None:
+            raise Exception("No RAG index version has been published yet")
+        if name != self.version:
+            self._open_version(name)
+
+    def _build_version(self):
+        """Ingests into a copy of the current version and publishes it. Call with the build lock held."""
+        if not os.path.exists(self.data_dir):
+            logger.error(f"Data directory {self.data_dir} does not exist.")
+            return
+        current = self.store.current()
+        if current is not None:
+            manifest = self._load_manifest(os.path.join(self.store.path(current), MANIFEST_FILENAME))
+            _, _, removed, changed = self._diff_policy_files(manifest)
+            if not removed and not changed:
+                logger.info(f"RAG index version {current} is up to date.")
+                return
+
+        name = self.store.create_version(base=current)
+        logger.info(f"Building RAG index version {name} (from {current or 'scratch'})")
+        self._use_dir(self.store.path(name))
+        self.lexical_index = BM25Index.load(self.lexical_path)
+        self._open_storage()
+        self._initialize_index()
+        if self.index is None:
+            raise Exception(f"Building RAG index version {name} failed")
+
+        # Readers serve this instead of each opening Chroma for the same query
+        contexts = {}
+        for platform in SUPPORTED_PLATFORMS:
+            context, degraded = self._retrieve_context(platform, POLICY_CONTEXT_QUERY, POLICY_CONTEXT_CANDIDATES)
+            # An empty context is a real answer here (no documents for the platform)
+            if not degraded:
+                contexts[platform] = context
+        with open(os.path.join(self.persist_dir, POLICY_CONTEXT_FILENAME), "w") as f:
+            json.dump(contexts, f)
+
+        self.store.publish(name, keep=settings.RAG_KEEP_VERSIONS)
+        self.version = name
+        self._policy_context_cache = {platform: (self.index_version, context) for platform, context in contexts.items()}
+        logger.info(f"Published RAG index version {name}")
+
+    def _open_version(self, name: str):
+        """Switches to a published version: its policy context now, BM25 on first use."""
+        path = self.store.path(name)
+        try:
+            with open(os.path.join(path, POLICY_CONTEXT_FILENAME), "r") as f:
+                contexts = json.load(f)
+        except FileNotFoundError:
+            contexts = {}
+        with self._open_lock:
+            self._use_dir(path)
+            # In-flight retrievals keep the old objects; old versions stay on disk for a while
+            self.client = self.chroma_collection = self.vector_store = self.storage_context = None
+            self.index = None
+            self.lexical_index = None
+            self.version = name
+            self._bump_index_version()
+            self._policy_context_cache = {
+                platform: (self.index_version, context) for platform, context in contexts.items()
+            }
+        logger.info(f"Serving RAG index version {name}")
+
+    async def start(self):
+        """Initializes in the background, retrying failures, then warms the policy context.
+
+        In shared mode it then keeps following newly published index versions.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(_executor, self.initialize)
+            if self.ready:
+                break
+            # Shared-mode readers waiting for the first published version check more often
+            delay = settings.RAG_RETRY_SECONDS
+            if self.store is not None and self.store.current() is None:
+                delay = min(delay, settings.RAG_VERSION_POLL_SECONDS)
+            logger.warning(f"RAG index unavailable; retrying in {delay}s")
+            await asyncio.sleep(delay)
+        await self.warm_policy_context()
+        if self.store is not None:
+            await self._follow_versions()
+
+    async def _follow_versions(self):
+        """Switches to each newly published shared index version."""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(settings.RAG_VERSION_POLL_SECONDS)
+            try:
+                name = self.store.current()
+                if name is not None and name != self.version:
+                    await loop.run_in_executor(_executor, self._open_version, name)
+                    await self.warm_policy_context()
+            except Exception as e:
+                logger.error(f"Failed to switch RAG index version: {str(e)}")
+
+    def start_background(self) -> asyncio.Task:
+        """Schedules start() without waiting for it, so the API can serve immediately."""
+        if self._startup_task is None or self._startup_task.done():
+            self.status = "starting"
+            self._startup_task = asyncio.create_task(self.start())
+        return self._startup_task
+
+    async def stop(self):
+        if self._startup_task and not self._startup_task.done():
+            self._startup_task.cancel()
+
+    def _ensure_index(self) -> bool:
+        """Returns whether the index is usable, initializing inline only for scripts.
+
+        Inside the API the background start() owns initialization, so requests
+        arriving before it finishes get degraded (empty) context instead of waiting.
+        """
+        if self.index is None and self.status == "not_started":
+            self.initialize()
+        return self.index is not None
+
+    def _open_collection(self):
+        from llama_index.core import StorageContext
+        from llama_index.vector_stores.chroma import ChromaVectorStore
+
         self.chroma_collection = self.client.get_or_create_collection("policy_violations")
         self.vector_store = ChromaVectorStore(chroma_collection=self.chroma_collection)
         self.storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
-        self.index = None
-        self._initialize_index()
 
     def _initialize_index(self):
-        """Initializes the index from storage or builds it if it doesn't exist."""
+        """Opens the index from storage and brings it in sync with policy_docs."""
+        from llama_index.core import VectorStoreIndex
+
         try:
             count = self.chroma_collection.count()
-            if count > 0:
-                logger.info(f"Loading existing index from ChromaDB ({count} documents)...")
-                self.index = VectorStoreIndex.from_vector_store(
-                    self.vector_store, storage_context=self.storage_context
-                )
-            else:
-                logger.info("Index is empty. Building new index...")
-                self.ingest_documents()
+            if count > 0 and not self._has_platform_metadata():
+                # Indexes built before platform tagging can't be filtered; rebuild them once
+                logger.warning("Existing index has no platform metadata. Rebuilding...")
+                self._reset_collection()
+                count = 0
+            if count > 0 and not os.path.exists(self.manifest_path):
+                # Without a manifest we can't tell which nodes belong to which file
+                logger.warning("Existing index has no ingest manifest. Rebuilding...")
+                self._reset_collection()
+                count = 0
+
+            logger.info(f"Loading index from ChromaDB ({count} nodes)...")
+            self.index = VectorStoreIndex.from_vector_store(
+                self.vector_store, storage_context=self.storage_context
+            )
+            self._bump_index_version()
+            self.ingest_documents()
+            self._sync_lexical_index()
         except Exception as e:
             logger.error(f"Failed to initialize RAG index: {str(e)}")
             self.index = None
 
+    def _has_platform_metadata(self) -> bool:
+        sample = self.chroma_collection.get(limit=1, include=["metadatas"])
+        metadatas = sample.get("metadatas") or []
+        return bool(metadatas) and "platform" in (metadatas[0] or {})
+
+    def _reset_collection(self):
+        """Drops the Chroma collection and its manifest and starts over with an empty one."""
+        self.client.delete_collection("policy_violations")
+        self._open_collection()
+        self.index = None
+        if os.path.exists(self.manifest_path):
+            os.remove(self.manifest_path)
+
+    def _load_manifest(self, path: Optional[str] = None) -> Dict[str, dict]:
+        """Returns {file_name: {"sha256": ..., "pages": ...}} for every fully indexed file."""
+        try:
+            with open(path or self.manifest_path, "r") as f:
+                return json.load(f).get("files", {})
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            logger.error(f"Ingest manifest is unreadable, treating every file as new: {str(e)}")
+            return {}
+
+    def _save_manifest(self, files: Dict[str, dict]):
+        """Writes the manifest atomically so an interrupted ingest never leaves it half-written."""
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"files": files}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _sync_lexical_index(self):
+        """Rebuilds the BM25 index from the Chroma chunks whenever the manifest has changed."""
+        source = hashlib.sha256(json.dumps(self._load_manifest(), sort_keys=True).encode()).hexdigest()
+        if self.lexical_index is not None and self.lexical_index.source == source:
+            return
+        stored = self.chroma_collection.get(include=["documents", "metadatas"])
+        chunks = [
+            {
+                "id": node_id,
+                "text": text or "",
+                "metadata": {
+                    key: (metadata or {}).get(key)
+                    for key in ("file_name", "platform", "page_label")
+                    if (metadata or {}).get(key) is not None
+                },
+            }
+            for node_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+        ]
+        index = BM25Index(chunks, source=source)
+        index.save(self.lexical_path)
+        self.lexical_index = index
+        self._bump_index_version()
+        logger.info(f"Built BM25 index over {len(chunks)} chunks.")
+
+    def _policy_files(self) -> Dict[str, str]:
+        """Returns {file_name: path} for the policy PDFs in data_dir."""
+        return {
+            name: os.path.join(self.data_dir, name)
+            for name in sorted(os.listdir(self.data_dir))
+            if name.lower().endswith(".pdf") and not name.startswith(".")
+        }
+
+    def _diff_policy_files(self, manifest: Dict[str, dict]) -> Tuple[Dict[str, str], Dict[str, str], List[str], List[str]]:
+        """Returns (files, hashes, removed, changed) of policy_docs against an ingest manifest."""
+        files = self._policy_files()
+        hashes = {name: _file_sha256(path) for name, path in files.items()}
+        removed = sorted(set(manifest) - set(files))
+        changed = [name for name in files if manifest.get(name, {}).get("sha256") != hashes[name]]
+        return files, hashes, removed, changed
+
+    def _parse_policy_file(self, path: str, file_hash: str):
+        """Loads one policy file and splits it into (documents, nodes) ready for embedding."""
+        from llama_index.core import Settings, SimpleDirectoryReader
+        from llama_index.core.ingestion import run_transformations
+
+        reader = SimpleDirectoryReader(input_files=[path], file_metadata=policy_file_metadata)
+        documents = reader.load_data()
+        for doc in documents:
+            doc.metadata["file_sha256"] = file_hash
+            # Keep embedded text independent of where and which version of the file
+            # was read, so the embedding cache stays valid across moves and rebuilds
+            doc.excluded_embed_metadata_keys.extend(["file_path", "file_sha256"])
+        return documents, run_transformations(documents, Settings.transformations)
+
     def ingest_documents(self):
-        """Ingests documents from the policy_docs directory."""
+        """Incrementally syncs the index with the policy_docs directory.
+
+        Only new or changed files (by SHA-256) are embedded, nodes of removed files
+        are deleted, and the manifest is checkpointed after every file so an
+        interrupted run (e.g. a 429) resumes where it stopped.
+        """
+        from llama_index.core import VectorStoreIndex
+
         if not os.path.exists(self.data_dir):
             logger.error(f"Data directory {self.data_dir} does not exist.")
             return
 
+        manifest = self._load_manifest()
+        files, hashes, removed, changed = self._diff_policy_files(manifest)
+        if not removed and not changed:
+            logger.info(f"RAG index is up to date ({len(files)} files).")
+            return
+
+        logger.info(f"RAG Ingestion: {len(changed)} new/changed and {len(removed)} removed of {len(files)} files.")
+        updated = False
         try:
-            logger.info(f"Loading documents from {self.data_dir}...")
-            reader = SimpleDirectoryReader(input_dir=self.data_dir)
-            documents = reader.load_data()
-            
-            # Diagnostic logging for file discovery
-            if documents:
-                file_names = list(set([doc.metadata.get('file_name', 'unknown') for doc in documents]))
-                logger.info(f"RAG Ingestion: Found {len(file_names)} unique files resulting in {len(documents)} total pages/chunks.")
-                for name in sorted(file_names):
-                    pcount = sum(1 for d in documents if d.metadata.get('file_name') == name)
-                    logger.info(f"  - {name} ({pcount} pages)")
-            
-            if not documents:
-                logger.warning("No documents found to ingest.")
-                return
+            for name in removed:
+                self.chroma_collection.delete(where={"file_name": name})
+                del manifest[name]
+                self._save_manifest(manifest)
+                updated = True
+                logger.info(f"  - removed {name}")
+
+            if changed and self.index is None:
+                self.index = VectorStoreIndex.from_vector_store(
+                    self.vector_store, storage_context=self.storage_context
+                )
+
+            # Parse files into groups big enough to fill every concurrent embedding batch,
+            # then embed each group at once and checkpoint file by file
+            group_size = self.embedding_pipeline.batch_size * self.embedding_pipeline.max_concurrency
+            group = []
+            for position, name in enumerate(changed):
+                group.append((name, *self._parse_policy_file(files[name], hashes[name])))
+                if position == len(changed) - 1 or sum(len(nodes) for _, _, nodes in group) >= group_size:
+                    self.embedding_pipeline.embed_nodes([node for _, _, nodes in group for node in nodes])
+                    for group_name, documents, nodes in group:
+                        # Drop nodes left by an older version or an interrupted run of this file
+                        self.chroma_collection.delete(where={"file_name": group_name})
+                        self.index.insert_nodes(nodes)
+                        manifest[group_name] = {"sha256": hashes[group_name], "pages": len(documents)}
+                        self._save_manifest(manifest)
+                        updated = True
+                        logger.info(f"  - indexed {group_name} ({len(documents)} pages, {len(nodes)} chunks)")
+                    group = []
 
-            logger.info(f"Starting ingestion of {len(documents)} documents. This may take a while due to Gemini API rate limits.")
-            self.index = VectorStoreIndex.from_documents(
-                documents,
-                storage_context=self.storage_context,
-                show_progress=True
-            )
             logger.info("Successfully indexed documents.")
         except Exception as e:
             logger.error(f"Failed to ingest documents: {str(e)}")
             if "429" in str(e) or "Resource exhausted" in str(e):
-                logger.error("QUOTA LIMIT REACHED")
+                logger.error("QUOTA LIMIT REACHED. Progress is checkpointed; the next run resumes from here.")
+        finally:
+            if updated:
+                self._bump_index_version()
 
     def query(self, platform: str, query_text: str, similarity_top_k: int = 5) -> str:
         """Queries the index for relevant policy snippets."""
-        # Try to re-initialize if index is missing (e.g. failed on startup)
-        if not self.index:
-            logger.info("RAG Index not initialized. Attempting re-initialization...")
-            self._initialize_index()
-
-        if not self.index:
-            logger.warning("RAG Index STILL not initialized. Returning empty context (fallback to general knowledge).")
+        if not self._ensure_index():
+            if self.is_shared_reader:
+                logger.warning("Shared RAG index readers only serve retrieval. Returning empty context.")
+            else:
+                logger.warning(f"RAG Index not ready ({self.status}). Returning empty context (fallback to general knowledge).")
             return ""
 
         try:
+            _configure_llm()
             # We add the platform to the query to guide retrieval
             enhanced_query = f"Regarding {platform} policies: {query_text}"
             query_engine = self.index.as_query_engine(similarity_top_k=similarity_top_k)
@@ -118,5 +536,154 @@ class RAGService:
             logger.error(f"Query failed: {str(e)}")
             return ""
 
-# Initialize global service instance
+    def retrieve(self, platform: str, query_text: str, similarity_top_k: int = 5) -> List["NodeWithScore"]:
+        """Returns the raw top-k policy chunks for a platform, without LLM synthesis.
+
+        Only that platform's (and general) documents can match: the vector search
+        pushes this down to Chroma as a `where` filter on the ingest-time
+        `platform` metadata, and BM25 filters on the same field.
+        RETRIEVAL_MODE selects vector, lexical (BM25, no network) or hybrid
+        (both, reciprocal-rank fused). Shared-mode readers always use BM25.
+        """
+        return self._retrieve(platform, query_text, similarity_top_k)[0]
+
+    def _retrieve(self, platform: str, query_text: str, similarity_top_k: int) -> Tuple[List["NodeWithScore"], bool]:
+        """Returns (chunks, degraded); degraded means lexical results stood in for a failed vector search."""
+        mode = settings.RETRIEVAL_MODE if settings.RETRIEVAL_MODE in RETRIEVAL_MODES else "hybrid"
+        platforms = [normalize_platform(platform), GENERAL_PLATFORM]
+        if mode == "lexical":
+            self._ensure_index()
+            return self._lexical_retrieve(platforms, query_text, similarity_top_k), False
+
+        if not self._ensure_index():
+            if self.is_shared_reader:
+                # By design, not a degradation: vector results are precomputed into the published context
+                return self._lexical_retrieve(platforms, query_text, similarity_top_k), False
+            logger.warning(f"RAG Index not ready ({self.status}). Using lexical policy chunks only.")
+            return self._lexical_retrieve(platforms, query_text, similarity_top_k), True
+
+        # Fetch deeper lists for fusion so each side can contribute its best matches
+        depth = similarity_top_k * 2 if mode == "hybrid" else similarity_top_k
+        try:
+            future = _vector_executor.submit(self._vector_retrieve, platforms, query_text, depth)
+            vector = future.result(timeout=settings.RETRIEVAL_VECTOR_TIMEOUT_SECONDS)
+        except FutureTimeoutError:
+            logger.error(f"Vector retrieval exceeded {settings.RETRIEVAL_VECTOR_TIMEOUT_SECONDS}s; using lexical results.")
+            return self._lexical_retrieve(platforms, query_text, similarity_top_k), True
+        except Exception as e:
+            logger.error(f"Vector retrieval failed, using lexical results: {str(e)}")
+            return self._lexical_retrieve(platforms, query_text, similarity_top_k), True
+        if mode == "vector":
+            return vector, False
+
+        lexical = self._lexical_retrieve(platforms, query_text, depth)
+        nodes = {item.node.node_id: item for item in lexical}
+        nodes.update({item.node.node_id: item for item in vector})
+        fused = reciprocal_rank_fusion(
+            [[item.node.node_id for item in vector], [item.node.node_id for item in lexical]], k=RRF_K
+        )
+        results = []
+        for node_id, score in fused[:similarity_top_k]:
+            nodes[node_id].score = score
+            results.append(nodes[node_id])
+        return results, False
+
+    def _vector_retrieve(self, platforms: List[str], query_text: str, top_k: int) -> List["NodeWithScore"]:
+        from llama_index.core.vector_stores import FilterOperator, MetadataFilter, MetadataFilters
+
+        filters = MetadataFilters(filters=[
+            MetadataFilter(key="platform", value=platforms, operator=FilterOperator.IN)
+        ])
+        retriever = self.index.as_retriever(similarity_top_k=top_k, filters=filters)
+        return retriever.retrieve(query_text)
+
+    def _lexical_retrieve(self, platforms: List[str], query_text: str, top_k: int) -> List["NodeWithScore"]:
+        if self.lexical_index is None:
+            with self._open_lock:
+                if self.lexical_index is None:
+                    self.lexical_index = BM25Index.load(self.lexical_path)
+        lexical_index = self.lexical_index
+        if lexical_index is None:
+            logger.warning("No BM25 index available. Returning no policy chunks.")
+            return []
+        from llama_index.core.schema import NodeWithScore, TextNode
+
+        return [
+            NodeWithScore(node=TextNode(id_=chunk["id"], text=chunk["text"], metadata=dict(chunk["metadata"])), score=score)
+            for chunk, score in lexical_index.search(query_text, platforms, top_k)
+        ]
+
+    def _retrieve_context(self, platform: str, query_text: str, similarity_top_k: int) -> Tuple[str, bool]:
+        """Formats retrieved chunks into a prompt-ready context block with their sources: (context, degraded).
+
+        Overlapping text is included once and the block is trimmed to the platform's token budget.
+        """
+        nodes, degraded = self._retrieve(platform, query_text, similarity_top_k)
+        RAG_CHUNKS.labels(settings.RETRIEVAL_MODE, "true" if degraded else "false").observe(len(nodes))
+        chunks = [
+            ContextChunk(item.node.get_content().strip(), item.node.metadata.get("file_name", "unknown"))
+            for item in nodes
+        ]
+        return assemble_context(chunks, context_budget(platform)), degraded
+
+    def _bump_index_version(self):
+        """Marks the index as changed and drops policy context computed from the old one."""
+        self.index_version += 1
+        self._policy_context_cache.clear()
+        logger.info(f"RAG index version is now {self.index_version}; policy context cache cleared.")
+
+    async def get_policy_context(self, platform: str) -> str:
+        """Returns the platform's policy context, computing it at most once per index version."""
+        with stage("rag_query") as timer:
+            timer.cache_hit = True
+            key = normalize_platform(platform)
+            cached = self._policy_context_cache.get(key)
+            if cached and cached[0] == self.index_version:
+                return cached[1]
+
+            # Concurrent misses for the same platform wait for a single computation
+            lock = self._policy_context_locks.setdefault(key, asyncio.Lock())
+            async with lock:
+                cached = self._policy_context_cache.get(key)
+                if cached and cached[0] == self.index_version:
+                    return cached[1]
+
+                timer.cache_hit = False
+                version = self.index_version
+                # Retrieval-only: the chunks go straight into the analysis prompt, so an
+                # extra LLM summarization pass would only add latency and quota use
+                loop = asyncio.get_running_loop()
+                retrieve = lambda: loop.run_in_executor(
+                    _executor, self._retrieve_context, platform, POLICY_CONTEXT_QUERY, POLICY_CONTEXT_CANDIDATES
+                )
+                # Vector retrieval embeds the query, so it takes an embedding slot; BM25 needs none
+                if settings.RETRIEVAL_MODE == "lexical" or self.is_shared_reader:
+                    context, degraded = await retrieve()
+                else:
+                    context, degraded = await embed_scheduler.admit(retrieve)
+                # Empty or fallback context means the index is (partly) unavailable; don't pin it
+                if context and not degraded and version == self.index_version:
+                    self._policy_context_cache[key] = (version, context)
+                return context
+
+    async def warm_policy_context(self, platforms: Optional[List[str]] = None):
+        """Precomputes policy context for each platform so first requests skip RAG."""
+        if not self.ready:
+            return
+        for platform in platforms or SUPPORTED_PLATFORMS:
+            try:
+                await self.get_policy_context(platform)
+                logger.info(f"Warmed policy context for {platform}")
+            except Exception as e:
+                logger.error(f"Failed to warm policy context for {platform}: {str(e)}")
+
+# Global service instance; cheap to construct; the index is opened by start() or on first use
 rag_service = RAGService()
+
+if __name__ == "__main__":
+    # One-off ingestion, e.g. a deploy step when the API runs with RAG_INGEST=false.
+    # In shared mode it waits for the build lock, then publishes a new version if needed.
+    logging.basicConfig(level=logging.INFO)
+    rag_service.initialize(wait_for_lock=True)
+    if not rag_service.ready:
+        raise SystemExit(1)
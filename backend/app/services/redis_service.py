@@ -1,36 +1,222 @@
 import json
-from app.core.security import get_redis_client
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, List, Optional
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS
+from app.core.security import get_async_redis_client, get_async_redis_pool
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Stored analysis values are zlib-compressed JSON behind this prefix; anything
+# without it is a plain JSON value written before compression was introduced
+_COMPRESSED_PREFIX = b"z1:"
+
+def encode_value(data: Any) -> bytes:
+    return _COMPRESSED_PREFIX + zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"))
+
+def decode_value(raw: bytes) -> Any:
+    if raw.startswith(_COMPRESSED_PREFIX):
+        raw = zlib.decompress(raw[len(_COMPRESSED_PREFIX):])
+    return json.loads(raw)
+
+class LocalCache:
+    """Bounded in-process LRU with a per-entry TTL."""
+
+    def __init__(self, max_entries: int, ttl: int):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[int] = None):
+        if self.max_entries <= 0:
+            return
+        ttl = min(self.ttl, ttl) if ttl else self.ttl
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
 class RedisService:
+    """Analysis result cache (in-process LRU, then Redis) plus the shared Redis client.
+
+    Redis errors trip a circuit breaker instead of disabling caching for good:
+    while it is open, `client` is None and lookups only use the local tier;
+    after CACHE_BREAKER_RESET_SECONDS the next call tries Redis again.
+    """
+
     def __init__(self):
+        self.ttl = settings.CACHE_TTL_SECONDS
+        self.local = LocalCache(settings.CACHE_LOCAL_MAX_ENTRIES, settings.CACHE_LOCAL_TTL_SECONDS)
+        self.stats = {tier: {"hits": 0, "misses": 0} for tier in ("local", "redis")}
+        self._client = None
+        self._binary_client = None
+        self._failures = 0
+        self._open_until = 0.0
+        self._connect()
+
+    def _connect(self):
         try:
-            self.client = get_redis_client()
+            # Text client for the coordination keys; binary client for compressed values
+            self._client = get_async_redis_client(get_async_redis_pool())
+            self._binary_client = get_async_redis_client(get_async_redis_pool(decode_responses=False))
             # Removed module-level ping to prevent startup delays
-        except Exception:
-            self.client = None
-        self.ttl = 3600 * 24  # Cache for 24 hours
+        except Exception as e:
+            logger.error(f"Redis client setup failed: {e}")
+            self._client = None
+            self._binary_client = None
+            self._trip()
+
+    def _available(self) -> bool:
+        if self._open_until and time.monotonic() < self._open_until:
+            return False
+        if self._client is None:
+            self._connect()
+        return self._client is not None
+
+    @property
+    def client(self):
+        """The shared text-mode client, or None while Redis is unavailable."""
+        return self._client if self._available() else None
+
+    def _trip(self):
+        self._open_until = time.monotonic() + settings.CACHE_BREAKER_RESET_SECONDS
+
+    def _record_success(self):
+        self._failures = 0
+        self._open_until = 0.0
+
+    def _record_failure(self, e: Exception):
+        self._failures += 1
+        if self._failures >= settings.CACHE_BREAKER_FAILURES:
+            logger.error(f"Redis failing ({e}); bypassing it for {settings.CACHE_BREAKER_RESET_SECONDS}s")
+            self._trip()
+        else:
+            logger.error(f"Redis error: {e}")
+
+    @staticmethod
+    def _decode(key: str, data: bytes) -> Optional[Any]:
+        """decode_value(), or None for a corrupt or foreign value, which is treated as a miss."""
+        try:
+            return decode_value(data)
+        except Exception as e:
+            logger.error(f"Undecodable cached value for {key}, ignoring it: {e}")
+            return None
+
+    def cache_stats(self) -> dict:
+        return {
+            **self.stats,
+            "local_entries": len(self.local),
+            "redis_breaker": "open" if not self._available() else "closed",
+        }
+
+    def _count(self, tier: str, result: str):
+        self.stats[tier][result] += 1
+        CACHE_LOOKUPS.labels(tier, "hit" if result == "hits" else "miss").inc()
+
+    async def get_cached_analysis(self, key: str):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local", "hits")
+            return value
+        self._count("local", "misses")
+
+        if not self._available():
+            return None
+        try:
+            data = await self._binary_client.get(key)
+            self._record_success()
+        except Exception as e:
+            self._record_failure(e)
+            return None
+        value = self._decode(key, data) if data else None
+        if value is None:
+            self._count("redis", "misses")
+            return None
+
+        self._count("redis", "hits")
+        logger.info(f"Cache hit for key: {key}")
+        self.local.set(key, value)
+        return value
+
+    async def set_cached_analysis(self, key: str, data: dict):
+        self.local.set(key, data)
+        if not self._available():
+            return
+        try:
+            await self._binary_client.setex(key, self.ttl, encode_value(data))
+            self._record_success()
+        except Exception as e:
+            self._record_failure(e)
+
+    async def get_values(self, keys: List[str]) -> List[Optional[Any]]:
+        """Reads compressed values (Redis tier only), None for each missing key."""
+        if not keys or not self._available():
+            return [None] * len(keys)
+        try:
+            raw = await self._binary_client.mget(keys)
+            self._record_success()
+        except Exception as e:
+            self._record_failure(e)
+            return [None] * len(keys)
+        return [self._decode(key, data) if data else None for key, data in zip(keys, raw)]
+
+    async def set_value(self, key: str, data: Any, ttl: int):
+        if not self._available():
+            return
+        try:
+            await self._binary_client.setex(key, ttl, encode_value(data))
+            self._record_success()
+        except Exception as e:
+            self._record_failure(e)
+
+    async def eval_script(self, script: str, keys: List[str], args: List[Any]) -> Optional[Any]:
+        """Runs a Lua script on the text client; None when Redis is unavailable or errors."""
+        if not self._available():
+            return None
+        try:
+            result = await self._client.eval(script, len(keys), *keys, *args)
+            self._record_success()
+            return result
+        except Exception as e:
+            self._record_failure(e)
+        return None
 
-    def get_cached_analysis(self, key: str):
-        if not self.client:
+    async def get_file_handle(self, file_hash: str):
+        """Returns the Gemini file name previously uploaded for this content hash."""
+        if not self._available():
             return None
         try:
-            data = self.client.get(key)
-            if data:
-                logger.info(f"Cache hit for key: {key}")
-                return json.loads(data)
+            file_name = await self._client.get(f"gemini_file:{file_hash}")
+            self._record_success()
+            return file_name
         except Exception as e:
-            logger.error(f"Redis get error: {e}")
+            self._record_failure(e)
         return None
 
-    def set_cached_analysis(self, key: str, data: dict):
-        if not self.client:
+    async def set_file_handle(self, file_hash: str, file_name: str, ttl: int):
+        if not self._available():
             return
         try:
-            self.client.setex(key, self.ttl, json.dumps(data))
+            await self._client.setex(f"gemini_file:{file_hash}", ttl, file_name)
+            self._record_success()
         except Exception as e:
-            logger.error(f"Redis set error: {e}")
+            self._record_failure(e)
 
 redis_service = RedisService()
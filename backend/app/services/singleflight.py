@@ -0,0 +1,144 @@
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+from app.core.config import settings
+from app.services.redis_service import redis_service
+import asyncio
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Delete the lease only if we still own it (it may have expired and been re-acquired)
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+class _Flight:
+    """One in-process execution of keyed work and how many callers await it."""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+class SingleFlight:
+    """Coalesces concurrent executions of the same keyed work.
+
+    Within a process, the work runs in its own task that every caller for the
+    key awaits, so a caller that goes away (a client disconnect) doesn't stop it
+    for the others; it is only cancelled once no caller is left. Across replicas, the leader holds a Redis lease
+    (`inflight:<key>`) and publishes on `inflight:<key>:done` when finished;
+    followers wait for that and read the leader's stored result via
+    `load_result`. If the leader fails or its lease lapses, a follower runs the
+    work itself, so coalescing never turns into an outage.
+    """
+
+    def __init__(self, lease_seconds: int = 420, wait_seconds: int = 420):
+        self.lease_seconds = lease_seconds
+        self.wait_seconds = wait_seconds
+        self._inflight: Dict[str, _Flight] = {}
+
+    async def do(
+        self,
+        key: str,
+        fn: Callable[[], Awaitable[T]],
+        load_result: Optional[Callable[[], Awaitable[Optional[T]]]] = None,
+    ) -> T:
+        """Runs `fn` once per key at a time; concurrent callers share its outcome.
+
+        Cross-replica coordination is only used when `load_result` is given, since
+        followers on other replicas need somewhere to read the result from.
+        """
+        flight = self._inflight.get(key)
+        if flight is None:
+            flight = self._inflight[key] = _Flight(asyncio.create_task(self._run_leader(key, fn, load_result)))
+            flight.task.add_done_callback(lambda task: self._finish(key, flight))
+        else:
+            logger.info(f"Joining in-flight work for {key}")
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                # Every caller went away; nobody needs the result
+                self._finish(key, flight)
+                flight.task.cancel()
+
+    def _finish(self, key: str, flight: "_Flight"):
+        if self._inflight.get(key) is flight:
+            del self._inflight[key]
+        if flight.task.done() and not flight.task.cancelled():
+            # Mark the exception as retrieved even if every caller was cancelled
+            flight.task.exception()
+
+    async def _run_leader(self, key, fn, load_result):
+        client = redis_service.client
+        if load_result is None or client is None:
+            return await fn()
+
+        lease_key = f"inflight:{key}"
+        token = uuid.uuid4().hex
+        try:
+            acquired = await client.set(lease_key, token, nx=True, ex=self.lease_seconds)
+        except Exception as e:
+            logger.error(f"Redis lease error, running {key} without cross-replica coalescing: {e}")
+            return await fn()
+
+        if not acquired:
+            result = await self._wait_for_leader(key, lease_key, load_result)
+            if result is not None:
+                return result
+            logger.warning(f"No result from the leader for {key}; running it here")
+            return await fn()
+
+        try:
+            return await fn()
+        finally:
+            try:
+                await client.eval(_RELEASE_SCRIPT, 1, lease_key, token)
+                await client.publish(f"{lease_key}:done", "1")
+            except Exception as e:
+                logger.error(f"Redis lease release error: {e}")
+
+    async def _wait_for_leader(self, key, lease_key, load_result):
+        """Waits for another replica's leader to finish and returns its stored result."""
+        logger.info(f"Waiting for another replica to finish {key}")
+        client = redis_service.client
+        pubsub = client.pubsub()
+        try:
+            await pubsub.subscribe(f"{lease_key}:done")
+            # The leader may have finished before we subscribed
+            result = await load_result()
+            if result is not None:
+                return result
+
+            deadline = time.monotonic() + self.wait_seconds
+            while time.monotonic() < deadline:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None:
+                    return await load_result()
+                # A crashed leader never publishes; its lease expiring is the signal
+                if not await client.exists(lease_key):
+                    return await load_result()
+            return None
+        except Exception as e:
+            logger.error(f"Redis wait error for {key}: {e}")
+            return None
+        finally:
+            try:
+                await pubsub.unsubscribe()
+                await pubsub.aclose()
+            except Exception:
+                pass
+
+# Shared by the analysis endpoints so identical work is coalesced process-wide
+analysis_flight = SingleFlight(
+    lease_seconds=settings.SINGLEFLIGHT_LEASE_SECONDS,
+    wait_seconds=settings.SINGLEFLIGHT_WAIT_SECONDS,
+)
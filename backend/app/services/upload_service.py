@@ -0,0 +1,208 @@
+from fastapi import HTTPException, Request
+from python_multipart.multipart import MultipartParser, parse_options_header
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple
+from app.core.config import settings
+from app.core.metrics import UPLOAD_BYTES, observe_stage
+import hashlib
+import tempfile
+import time
+import os
+
+class StagedFile(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+    filename: str
+
+def declared_sha256(fields: Dict[str, List[str]]) -> str:
+    """The client's `sha256` form field, normalized like computed digests; "" if absent."""
+    return (fields.get("sha256") or [""])[0].strip().lower()
+
+class StreamedUpload(NamedTuple):
+    """A multipart request parsed straight off the wire.
+
+    `path` is None when `on_file_start` asked to skip the file, i.e. the
+    request could be answered from the form fields alone. `path`, `sha256`
+    and `size` describe the first file; `files` lists all of them.
+    """
+    fields: Dict[str, List[str]]
+    path: Optional[str]
+    sha256: Optional[str]
+    size: int
+    files: List[StagedFile] = []
+
+    def field(self, name: str) -> Optional[str]:
+        values = self.fields.get(name)
+        return values[0] if values else None
+
+# Documents the multipart body for endpoints that read request.stream() themselves
+def multipart_openapi(properties: Dict[str, dict], required: List[str]) -> dict:
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {"type": "object", "properties": properties, "required": required}
+                }
+            },
+        }
+    }
+
+class _PartCollector:
+    """Turns MultipartParser's synchronous callbacks into a list of part events."""
+
+    def __init__(self):
+        self.events: List[Tuple[str, object]] = []
+        self._headers: Dict[bytes, bytes] = {}
+        self._field = b""
+        self._value = b""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        }
+
+    def _on_part_begin(self):
+        self._headers = {}
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._field += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._value += data[start:end]
+
+    def _on_header_end(self):
+        self._headers[self._field.lower()] = self._value
+        self._field = b""
+        self._value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._headers.get(b"content-disposition", b""))
+        name = options.get(b"name", b"").decode("latin-1")
+        filename = options[b"filename"].decode("utf-8", errors="replace") if b"filename" in options else None
+        self.events.append(("begin", (name, filename)))
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        self.events.append(("data", data[start:end]))
+
+    def _on_part_end(self):
+        self.events.append(("end", None))
+
+async def stream_upload(
+    request: Request,
+    file_field: str = "file",
+    directory: Optional[str] = None,
+    on_file_start: Optional[Callable[[Dict[str, List[str]]], Awaitable[bool]]] = None,
+    max_files: int = 1,
+) -> StreamedUpload:
+    """Parses a multipart body as it arrives, hashing and writing the file part exactly once.
+
+    Unlike UploadFile, the body is never spooled by Starlette first, so a large
+    upload costs one pass and one copy on disk. Bodies over MAX_UPLOAD_BYTES are
+    rejected with 413, from Content-Length when sent, otherwise as soon as the
+    limit is crossed. `on_file_start` sees the fields sent before the file; if it
+    returns True the rest of the body is not read (send fields first to benefit).
+    A `sha256` field, when present, must match the received file. With
+    `max_files` > 1 every `file_field` part is staged and hashed separately.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data body")
+
+    max_bytes = settings.MAX_UPLOAD_BYTES
+    declared = request.headers.get("content-length")
+    if max_bytes and declared and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+
+    collector = _PartCollector()
+    parser = MultipartParser(params[b"boundary"], collector.callbacks())
+    fields: Dict[str, List[str]] = {}
+    files: List[StagedFile] = []
+    sha256_hash = None
+    tmp_path = None
+    tmp = None
+    filename = None
+    size = 0
+    received = 0
+    part_name = None
+    part_value = bytearray()
+    in_file = False
+    started = time.perf_counter()
+    hash_seconds = 0.0
+
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if max_bytes and received > max_bytes:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds the {max_bytes} byte limit")
+            parser.write(chunk)
+
+            for kind, payload in collector.events:
+                if kind == "begin":
+                    part_name, filename = payload
+                    in_file = part_name == file_field and filename is not None
+                    if not in_file:
+                        part_value = bytearray()
+                        continue
+                    if len(files) >= max_files:
+                        if max_files == 1:
+                            raise HTTPException(status_code=400, detail="Only one file may be uploaded")
+                        raise HTTPException(status_code=400, detail=f"At most {max_files} files may be uploaded")
+                    if not files and on_file_start and await on_file_start(fields):
+                        observe_stage("upload_read", time.perf_counter() - started, cache_hit=True)
+                        return StreamedUpload(fields=fields, path=None, sha256=None, size=0)
+                    sha256_hash = hashlib.sha256()
+                    size = 0
+                    suffix = os.path.splitext(filename)[1] or ".mp4"
+                    fd, tmp_path = tempfile.mkstemp(suffix=suffix, dir=directory)
+                    # Large buffered writes; the ASGI server hands us small chunks
+                    tmp = os.fdopen(fd, "wb", buffering=settings.UPLOAD_CHUNK_BYTES)
+                elif kind == "data":
+                    if in_file:
+                        hash_started = time.perf_counter()
+                        sha256_hash.update(payload)
+                        hash_seconds += time.perf_counter() - hash_started
+                        tmp.write(payload)
+                        size += len(payload)
+                    else:
+                        part_value.extend(payload)
+                elif kind == "end":
+                    if in_file:
+                        tmp.close()
+                        tmp = None
+                        in_file = False
+                        files.append(StagedFile(tmp_path, sha256_hash.hexdigest(), size, filename))
+                        tmp_path = None
+                    elif part_name:
+                        fields.setdefault(part_name, []).append(part_value.decode("utf-8", errors="replace"))
+            collector.events.clear()
+        parser.finalize()
+
+        if tmp is not None:
+            raise HTTPException(status_code=400, detail="Incomplete multipart body")
+        if not files:
+            raise HTTPException(status_code=400, detail=f"Missing file field '{file_field}'")
+
+        # upload_read covers the whole body, including the hashing also reported on its own
+        observe_stage("upload_read", time.perf_counter() - started)
+        observe_stage("hash", hash_seconds)
+        UPLOAD_BYTES.labels("received").inc(sum(staged.size for staged in files))
+
+        first = files[0]
+        declared_hash = declared_sha256(fields)
+        if max_files == 1 and declared_hash and declared_hash != first.sha256:
+            raise HTTPException(status_code=400, detail="sha256 does not match the uploaded file")
+        return StreamedUpload(fields=fields, path=first.path, sha256=first.sha256, size=first.size, files=files)
+    except BaseException:
+        if tmp is not None:
+            tmp.close()
+        for path in [tmp_path] + [staged.path for staged in files]:
+            if path and os.path.exists(path):
+                os.remove(path)
+        raise
@@ -0,0 +1,204 @@
+"""Offline stand-ins for the Gemini client and embedding model used by the benchmarks."""
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from typing import Dict, List
+from llama_index.core.embeddings import BaseEmbedding
+from pydantic import PrivateAttr
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import time
+
+@dataclass
+class FakeGeminiConfig:
+    # generate_content latency: uniform in [latency * (1 - jitter), latency * (1 + jitter)]
+    generate_latency: float = 1.0
+    latency_jitter: float = 0.3
+    upload_latency: float = 0.2
+    # Uploads stay PROCESSING for this many files.get calls before turning ACTIVE
+    processing_polls: int = 1
+    # Fractions of generate_content calls that fail with a 500 or a 429
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    seed: int = 0
+
+@dataclass
+class FakeGeminiStats:
+    uploads: int = 0
+    upload_bytes: int = 0
+    files_get: int = 0
+    generates: int = 0
+    errors: int = 0
+    rate_limited: int = 0
+    caches_created: int = 0
+    cached_generates: int = 0
+    prompt_chars: List[int] = field(default_factory=list)
+
+    def snapshot(self) -> dict:
+        prompts = sorted(self.prompt_chars)
+        return {
+            "uploads": self.uploads,
+            "upload_bytes": self.upload_bytes,
+            "files_get": self.files_get,
+            "generates": self.generates,
+            "errors": self.errors,
+            "rate_limited": self.rate_limited,
+            "caches_created": self.caches_created,
+            "cached_generates": self.cached_generates,
+            "prompt_chars_mean": round(sum(prompts) / len(prompts)) if prompts else 0,
+        }
+
+class _FakeFiles:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+        self._polls: Dict[str, int] = {}
+        self._ids = itertools.count()
+
+    def _file(self, name: str, state: str):
+        return SimpleNamespace(
+            name=name,
+            uri=f"https://fake.local/{name}",
+            display_name=name,
+            state=state,
+            expiration_time=datetime.now(timezone.utc) + timedelta(hours=48),
+        )
+
+    async def upload(self, file: str, config=None):
+        stats = self._client.stats
+        stats.uploads += 1
+        stats.upload_bytes += os.path.getsize(file)
+        await asyncio.sleep(self._client.config.upload_latency)
+        name = f"files/{next(self._ids)}"
+        self._polls[name] = self._client.config.processing_polls
+        return self._file(name, "PROCESSING" if self._polls[name] else "ACTIVE")
+
+    async def get(self, name: str, config=None):
+        self._client.stats.files_get += 1
+        if name not in self._polls:
+            raise Exception(f"404 NOT_FOUND: {name}")
+        remaining = self._polls[name]
+        self._polls[name] = max(0, remaining - 1)
+        return self._file(name, "PROCESSING" if remaining else "ACTIVE")
+
+class _FakeCaches:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+        self.contents: Dict[str, str] = {}
+        self._ids = itertools.count()
+
+    async def create(self, model: str, config=None):
+        config = config or {}
+        self._client.stats.caches_created += 1
+        await asyncio.sleep(self._client.config.upload_latency)
+        name = f"cachedContents/{next(self._ids)}"
+        self.contents[name] = "\n".join(
+            [str(config.get("system_instruction") or ""), *map(str, config.get("contents") or [])]
+        )
+        return SimpleNamespace(name=name, model=model)
+
+class _FakeModels:
+    def __init__(self, client: "FakeGeminiClient"):
+        self._client = client
+
+    async def generate_content(self, model: str, contents, config=None):
+        client = self._client
+        prompt = str(contents[0] if isinstance(contents, list) else contents)
+        cached_content = (config or {}).get("cached_content")
+        if cached_content:
+            if cached_content not in client.aio.caches.contents:
+                raise Exception(f"404 NOT_FOUND: cached content {cached_content} not found")
+            client.stats.cached_generates += 1
+            # Like the real API, the cached prefix counts toward the prompt
+            prompt = f"{client.aio.caches.contents[cached_content]}\n{prompt}"
+        client.stats.generates += 1
+        client.stats.prompt_chars.append(len(str(prompt)))
+        latency = client.config.generate_latency
+        await asyncio.sleep(max(0.0, latency * (1 + client.random.uniform(-1, 1) * client.config.latency_jitter)))
+
+        roll = client.random.random()
+        if roll < client.config.rate_limit_rate:
+            client.stats.rate_limited += 1
+            raise Exception("429 RESOURCE_EXHAUSTED. Resource has been exhausted (e.g. check quota).")
+        if roll < client.config.rate_limit_rate + client.config.error_rate:
+            client.stats.errors += 1
+            raise Exception("500 INTERNAL. An internal error has occurred.")
+        return SimpleNamespace(text=json.dumps(self._verdict(prompt)))
+
+    @staticmethod
+    def _verdict(prompt: str) -> dict:
+        issue = {"category": "Violence", "timestamp": "00:12", "snippet": "example", "rationale": "Benchmark verdict"}
+        transcript_ids = re.findall(r'<transcript id="([^"]+)">', prompt)
+        if transcript_ids:
+            return {
+                "results": [
+                    {"id": item_id, "risk_level": "Low", "summary_rationale": "Benchmark verdict.", "issues": []}
+                    for item_id in transcript_ids
+                ]
+            }
+        match = re.search(r"^Platform: (\S+)", prompt, re.MULTILINE)
+        return {
+            "platform": match.group(1) if match else "unknown",
+            "risk_level": "Medium",
+            "summary_rationale": "Benchmark verdict.",
+            "issues": [issue],
+        }
+
+class FakeGeminiClient:
+    """Mimics the parts of genai.Client the service uses: aio.files, aio.caches and aio.models."""
+
+    def __init__(self, config: FakeGeminiConfig):
+        self.config = config
+        self.stats = FakeGeminiStats()
+        self.random = random.Random(config.seed)
+        self.aio = SimpleNamespace(files=_FakeFiles(self), caches=_FakeCaches(self), models=_FakeModels(self))
+
+    def reset_stats(self):
+        self.stats = FakeGeminiStats()
+
+class FakeEmbedding(BaseEmbedding):
+    """Deterministic hashed bag-of-words vectors with a simulated per-call latency.
+
+    Texts sharing words get similar vectors, so vector retrieval returns
+    plausible chunks without any network calls.
+    """
+
+    _dimensions: int = PrivateAttr()
+    _latency: float = PrivateAttr()
+
+    def __init__(self, dimensions: int = 256, latency: float = 0.05, **kwargs):
+        super().__init__(model_name="benchmark-fake-embedding", **kwargs)
+        self._dimensions = dimensions
+        self._latency = latency
+
+    def _vector(self, text: str) -> List[float]:
+        vector = [0.0] * self._dimensions
+        for token in re.findall(r"[a-z0-9]+", text.lower()):
+            bucket = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=4).digest(), "little")
+            vector[bucket % self._dimensions] += 1.0
+        norm = sum(value * value for value in vector) ** 0.5 or 1.0
+        return [value / norm for value in vector]
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        time.sleep(self._latency)
+        return self._vector(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        await asyncio.sleep(self._latency)
+        return self._vector(query)
+
+    def _get_text_embedding(self, text: str) -> List[float]:
+        return self._vector(text)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        # One simulated request per batch, like the real batch endpoint
+        time.sleep(self._latency)
+        return [self._vector(text) for text in texts]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._latency)
+        return [self._vector(text) for text in texts]
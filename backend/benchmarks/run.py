@@ -0,0 +1,335 @@
+"""Offline load benchmark for the API.
+
+Drives the real FastAPI app in-process (httpx ASGI transport) with a fake Gemini
+client and a fake embedding model, so runs need no network or API key and are
+comparable between commits. Run from the backend directory:
+
+    python -m benchmarks.run --output bench.json
+    python -m benchmarks.run --baseline bench-main.json --max-regression 0.2
+
+Scenarios: cache_hit, cache_miss, large_upload, rag_cold. Without --redis-url,
+Redis is unreachable and the service runs on its in-process cache tier.
+"""
+from collections import Counter
+from typing import Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import hashlib
+import itertools
+import json
+import logging
+import os
+import platform as host_platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+SCENARIOS = ("cache_hit", "cache_miss", "large_upload", "rag_cold")
+RESULT_FORMAT_VERSION = 1
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=100, help="Requests per scenario (large_upload uses --large-requests)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--media-kb", type=int, default=512, help="Size of each cache_hit/cache_miss upload")
+    parser.add_argument("--large-mb", type=int, default=64)
+    parser.add_argument("--large-requests", type=int, default=4)
+    parser.add_argument("--generate-latency", type=float, default=1.0, help="Seconds per fake generate_content call")
+    parser.add_argument("--latency-jitter", type=float, default=0.3)
+    parser.add_argument("--upload-latency", type=float, default=0.2)
+    parser.add_argument("--processing-polls", type=int, default=1, help="files.get calls before an upload is ACTIVE")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of generations failing with a 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="Fraction of generations failing with a 429")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="Seconds per fake embedding request")
+    parser.add_argument("--policy-docs", default=None, help="Policy PDFs to index (defaults to backend/policy_docs)")
+    parser.add_argument("--redis-url", default=None, help="Use a real Redis instead of the in-process cache only")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report Python heap peaks (slower)")
+    parser.add_argument("--output", help="Write results as JSON to this path")
+    parser.add_argument("--baseline", help="Earlier --output JSON to compare against")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Exit 1 if p95 latency or throughput regresses by more than this fraction vs --baseline")
+    parser.add_argument("--verbose", action="store_true", help="Show the service's own logs")
+    return parser.parse_args(argv)
+
+def configure_environment(args: argparse.Namespace, workdir: str):
+    """Settings are read at import time, so this runs before the app is imported."""
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.environ["JOB_BACKEND"] = "memory"
+    os.environ["RAG_PERSIST_DIR"] = os.path.join(workdir, "chroma_db")
+    # Keep media local and deterministic: no transcode, fingerprint or ffprobe-based segmenting
+    os.environ["MEDIA_PROFILE"] = "original"
+    os.environ["FINGERPRINT_ENABLED"] = "false"
+    os.environ["SEGMENT_THRESHOLD_SECONDS"] = "0"
+    os.environ["MAX_UPLOAD_BYTES"] = str(max(args.large_mb + 16, 64) * 1024 * 1024)
+    if args.redis_url:
+        os.environ["REDIS_URL"] = args.redis_url
+    else:
+        # Nothing listens on port 1: the first failures open the breaker for the whole run
+        os.environ["REDIS_URL"] = "redis://127.0.0.1:1/0"
+        os.environ["CACHE_BREAKER_FAILURES"] = "1"
+        os.environ["CACHE_BREAKER_RESET_SECONDS"] = "86400"
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.CRITICAL)
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Linear interpolation between closest ranks, q in [0, 100]."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+def rss_mb() -> Optional[float]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return None
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+def write_media(path: str, size: int, seed: int):
+    """Writes `size` pseudo-random bytes whose content (and hash) is unique per seed."""
+    block = hashlib.sha256(f"block-{seed}".encode()).digest() * (2**16 // 32)
+    with open(path, "wb") as f:
+        f.write(f"benchmark-media-{seed}\n".encode())
+        written = 0
+        while written < size:
+            chunk = block[: size - written]
+            f.write(chunk)
+            written += len(chunk)
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(2**20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+async def run_load(
+    request: Callable[[int], Awaitable[int]], total: int, concurrency: int, fake_client, measure_heap: bool
+) -> dict:
+    """Issues `total` requests from `concurrency` workers and summarizes latency, throughput and memory."""
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    indexes = itertools.count()
+    fake_client.reset_stats()
+    rss_before = rss_mb()
+    if measure_heap:
+        tracemalloc.reset_peak()
+
+    async def worker():
+        while (index := next(indexes)) < total:
+            started = time.perf_counter()
+            try:
+                status = await request(index)
+            except Exception as e:
+                status = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+    wall = time.perf_counter() - started
+
+    latencies.sort()
+    memory = {"rss_before_mb": rss_before, "rss_after_mb": rss_mb(), "rss_peak_mb": peak_rss_mb()}
+    if measure_heap:
+        memory["python_heap_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+    return {
+        "requests": total,
+        "concurrency": min(concurrency, total),
+        "ok": statuses.get("200", 0),
+        "status_codes": dict(statuses),
+        "wall_seconds": wall,
+        "throughput_rps": total / wall if wall else 0.0,
+        "latency_ms": {
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "mean": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+            "max": latencies[-1] * 1000 if latencies else 0.0,
+        },
+        "memory": memory,
+        "gemini": fake_client.stats.snapshot(),
+    }
+
+async def run_benchmarks(args: argparse.Namespace, workdir: str) -> dict:
+    from llama_index.core import Settings as LlamaSettings
+    import httpx
+    from benchmarks.fakes import FakeEmbedding, FakeGeminiClient, FakeGeminiConfig
+    from app.core.security import limiter
+    from app.main import app
+    from app.services import gemini_service
+    from app.services import rag_service as rag_module
+    from app.services.rag_service import SUPPORTED_PLATFORMS, rag_service
+
+    fake_client = FakeGeminiClient(FakeGeminiConfig(
+        generate_latency=args.generate_latency,
+        latency_jitter=args.latency_jitter,
+        upload_latency=args.upload_latency,
+        processing_polls=args.processing_polls,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    ))
+    gemini_service._client = fake_client
+    # Stand in for the Gemini embedding model that _configure_llama_index would install
+    LlamaSettings.embed_model = FakeEmbedding(latency=args.embed_latency)
+    rag_module._llama_index_configured = True
+    if args.policy_docs:
+        rag_service.data_dir = os.path.abspath(args.policy_docs)
+    # The per-client rate limits would turn a load test into a 429 test
+    limiter.enabled = False
+
+    setup_started = time.perf_counter()
+    await asyncio.get_running_loop().run_in_executor(None, rag_service.initialize)
+    setup = {"rag_status": rag_service.status, "rag_build_seconds": time.perf_counter() - setup_started}
+    await rag_service.warm_policy_context()
+
+    media_dir = os.path.join(workdir, "media")
+    os.makedirs(media_dir)
+    platforms = SUPPORTED_PLATFORMS
+    selected = [name for name in args.scenarios.split(",") if name]
+    results: Dict[str, dict] = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+        async def analyze(path: str, platform: str, sha256: Optional[str] = None) -> int:
+            fields = {"platform": (None, platform)}
+            if sha256:
+                fields["sha256"] = (None, sha256)
+            with open(path, "rb") as f:
+                fields["file"] = (os.path.basename(path), f, "video/mp4")
+                response = await client.post("/analyze", files=fields)
+            return response.status_code
+
+        for name in selected:
+            if name == "cache_hit":
+                path = os.path.join(media_dir, "hit.mp4")
+                write_media(path, args.media_kb * 1024, seed=-1)
+                sha256 = file_sha256(path)
+                for platform in platforms:
+                    await analyze(path, platform)
+                request = lambda i: analyze(path, platforms[i % len(platforms)], sha256)
+                total = args.requests
+            elif name == "cache_miss":
+                paths = []
+                for i in range(args.requests):
+                    paths.append(os.path.join(media_dir, f"miss-{i}.mp4"))
+                    write_media(paths[-1], args.media_kb * 1024, seed=i)
+                request = lambda i: analyze(paths[i], platforms[i % len(platforms)])
+                total = args.requests
+            elif name == "large_upload":
+                large = []
+                for i in range(args.large_requests):
+                    large.append(os.path.join(media_dir, f"large-{i}.mp4"))
+                    write_media(large[-1], args.large_mb * 2**20, seed=10**6 + i)
+                request = lambda i: analyze(large[i], platforms[i % len(platforms)])
+                total = args.large_requests
+            elif name == "rag_cold":
+                async def request(i: int) -> int:
+                    # Invalidate the cached policy context so every request retrieves again
+                    rag_service.index_version += 1
+                    response = await client.post(
+                        "/analyze/text",
+                        json={"platform": platforms[i % len(platforms)], "transcript": f"Benchmark transcript {i}: {'words ' * 50}"},
+                    )
+                    return response.status_code
+                total = args.requests
+            else:
+                raise SystemExit(f"Unknown scenario {name!r}; choose from {', '.join(SCENARIOS)}")
+
+            print(f"Running {name} ({total} requests, concurrency {min(args.concurrency, total)})...", file=sys.stderr)
+            results[name] = await run_load(request, total, args.concurrency, fake_client, args.tracemalloc)
+            if name in ("cache_miss", "large_upload"):
+                for entry in os.listdir(media_dir):
+                    os.remove(os.path.join(media_dir, entry))
+
+    return {"setup": setup, "scenarios": results}
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def print_report(report: dict):
+    print(f"\ncommit {report['commit'] or 'unknown'}  rag {report['setup']['rag_status']} "
+          f"(built in {report['setup']['rag_build_seconds']:.1f}s)")
+    print(f"{'scenario':<14}{'ok/total':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}{'rss MB':>9}")
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        print(
+            f"{name:<14}{result['ok']:>5}/{result['requests']:<4}{latency['p50']:>10.1f}{latency['p95']:>10.1f}"
+            f"{latency['p99']:>10.1f}{result['throughput_rps']:>9.2f}{result['memory']['rss_peak_mb']:>9.0f}"
+        )
+
+def compare(report: dict, baseline: dict, max_regression: Optional[float]) -> bool:
+    """Prints changes against the baseline; returns False if a regression exceeds the limit."""
+    passed = True
+    print(f"\nvs baseline {baseline.get('commit') or 'unknown'}")
+    differing = sorted(
+        key for key, value in report["config"].items()
+        if key in baseline.get("config", {}) and baseline["config"][key] != value
+    )
+    if differing:
+        print(f"note: run settings differ from the baseline ({', '.join(differing)})")
+    print(f"{'scenario':<14}{'p50':>10}{'p95':>10}{'p99':>10}{'req/s':>10}")
+    for name, result in report["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if not old:
+            continue
+        changes = {
+            key: (result["latency_ms"][key] - old["latency_ms"][key]) / old["latency_ms"][key]
+            if old["latency_ms"][key] else 0.0
+            for key in ("p50", "p95", "p99")
+        }
+        throughput = (
+            (result["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] if old["throughput_rps"] else 0.0
+        )
+        print(f"{name:<14}" + "".join(f"{changes[key]:>+10.1%}" for key in ("p50", "p95", "p99")) + f"{throughput:>+10.1%}")
+        if max_regression is not None and (changes["p95"] > max_regression or -throughput > max_regression):
+            print(f"  {name}: regression beyond {max_regression:.0%}")
+            passed = False
+    return passed
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="contentshield-bench-") as workdir:
+        configure_environment(args, workdir)
+        if args.tracemalloc:
+            tracemalloc.start()
+        outcome = asyncio.run(run_benchmarks(args, workdir))
+
+    report = {
+        "format": RESULT_FORMAT_VERSION,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "host": {"python": host_platform.python_version(), "platform": host_platform.platform(), "cpus": os.cpu_count()},
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "baseline", "verbose")},
+        **outcome,
+    }
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            if not compare(report, json.load(f), args.max_regression):
+                sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks.fakes import FakeEmbedding
+from app.services.embedding_pipeline import EmbeddingCache, EmbeddingPipeline
+
+POLICY_DOCS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy_docs")
+SAMPLE_FILES = ["Privacy and Security.Tiktok.pdf.pdf", "Cybersecurity.Instagram.pdf.pdf"]
+
+class CountingEmbedding(FakeEmbedding):
+    """FakeEmbedding that records how many texts were sent to be embedded."""
+
+    def __init__(self):
+        super().__init__(dimensions=32, latency=0)
+        self._embedded = []
+
+    async def _aget_text_embeddings(self, texts):
+        self._embedded.extend(texts)
+        return await super()._aget_text_embeddings(texts)
+
+    def take(self) -> int:
+        count = len(self._embedded)
+        self._embedded.clear()
+        return count
+
+def test_embedding_cache_is_reused():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache_path = os.path.join(tmp, "embedding_cache.sqlite3")
+        model = CountingEmbedding()
+        texts = ["no weapons", "no drugs", "no weapons"]
+
+        first = asyncio.run(EmbeddingPipeline(model, cache=EmbeddingCache(cache_path), batch_size=2).aembed_texts(texts))
+        # Repeats within a call are embedded once
+        assert model.take() == 2
+        assert first[0] == first[2]
+
+        # A new pipeline (e.g. after a restart) over the same file embeds only the new text
+        second = asyncio.run(EmbeddingPipeline(model, cache=EmbeddingCache(cache_path)).aembed_texts(texts + ["no spam"]))
+        assert model.take() == 1
+        # Stored as float32
+        assert all(abs(a - b) < 1e-6 for cached, fresh in zip(second, first) for a, b in zip(cached, fresh))
+
+def open_service(persist_dir: str, data_dir: str, model: CountingEmbedding):
+    from llama_index.core import Settings
+    from app.services import rag_service as rag_module
+
+    # Stand in for Gemini: no API key or network
+    Settings.embed_model = model
+    rag_module._llama_index_configured = True
+    service = rag_module.RAGService(persist_dir=persist_dir, data_dir=data_dir)
+    service._open_storage()
+    service.embedding_pipeline = EmbeddingPipeline(
+        model, cache=EmbeddingCache(os.path.join(persist_dir, "embedding_cache.sqlite3")), requests_per_minute=0
+    )
+    return service
+
+def indexed_files(service) -> set:
+    stored = service.chroma_collection.get(include=["metadatas"])
+    return {metadata["file_name"] for metadata in stored["metadatas"]}
+
+def test_incremental_ingest():
+    with tempfile.TemporaryDirectory() as tmp:
+        persist_dir = os.path.join(tmp, "chroma_db")
+        data_dir = os.path.join(tmp, "policy_docs")
+        os.makedirs(data_dir)
+        for name in SAMPLE_FILES:
+            shutil.copy(os.path.join(POLICY_DOCS, name), data_dir)
+        model = CountingEmbedding()
+
+        # First run embeds every chunk of every file
+        service = open_service(persist_dir, data_dir, model)
+        service._initialize_index()
+        assert service.index is not None
+        chunks = service.chroma_collection.count()
+        assert chunks > 0 and model.take() == chunks
+        assert indexed_files(service) == set(SAMPLE_FILES)
+
+        # Nothing changed: a re-run (fresh process) embeds nothing
+        service = open_service(persist_dir, data_dir, model)
+        service._initialize_index()
+        assert model.take() == 0
+        assert service.chroma_collection.count() == chunks
+
+        # A removed file's nodes go, with nothing embedded
+        os.remove(os.path.join(data_dir, SAMPLE_FILES[1]))
+        service.ingest_documents()
+        assert model.take() == 0
+        assert indexed_files(service) == {SAMPLE_FILES[0]}
+        assert set(service._load_manifest()) == {SAMPLE_FILES[0]}
+
+if __name__ == "__main__":
+    test_embedding_cache_is_reused()
+    test_incremental_ingest()
+    print("ok")
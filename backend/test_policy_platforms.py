@@ -0,0 +1,30 @@
+import os
+import sys
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.rag_service import GENERAL_PLATFORM, SUPPORTED_PLATFORMS, platform_from_filename
+
+POLICY_DOCS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "policy_docs")
+
+def test_platform_from_filename():
+    assert platform_from_filename("Spam Transparency Center.Instagram.pdf.pdf") == "instagram"
+    assert platform_from_filename("Enforcement.Tiktok.pdf.pdf") == "tiktok"
+    assert platform_from_filename("For You feed Eligibility Standards.Tiktok.pdf.pdf") == "tiktok"
+    assert platform_from_filename("Violent Content Policy.(X)Twitter.pdf") == "twitter"
+    assert platform_from_filename("Community Guidelines.YouTube.pdf") == "youtube"
+    # No platform suffix: general policy, included for every platform
+    assert platform_from_filename("Platform Basics.pdf") == GENERAL_PLATFORM
+    assert platform_from_filename("Platform Basics.pdf.pdf") == GENERAL_PLATFORM
+
+def test_bundled_policy_docs_are_platform_specific():
+    # A platform's rules tagged "general" would leak into every other platform's context
+    for name in os.listdir(POLICY_DOCS):
+        if name.lower().endswith(".pdf"):
+            assert platform_from_filename(name) in SUPPORTED_PLATFORMS, name
+
+if __name__ == "__main__":
+    test_platform_from_filename()
+    test_bundled_policy_docs_are_platform_specific()
+    print("ok")
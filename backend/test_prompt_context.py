@@ -0,0 +1,62 @@
+import os
+import sys
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.prompt_service import MIN_PARTIAL_CHUNK_TOKENS, ContextChunk, assemble_context
+from app.services.quota_service import count_tokens
+
+def sentences(label: str, count: int, words: int = 10) -> str:
+    return " ".join(f"{label} rule {i} " + " ".join(["word"] * (words - 3)) + "." for i in range(count))
+
+def test_empty_context():
+    assert assemble_context([], 500) == ""
+
+def test_ranked_chunks_are_trimmed_at_the_budget():
+    best = ContextChunk(sentences("alpha", 5), "best.pdf")
+    second = ContextChunk(sentences("beta", 20), "second.pdf")
+    third = ContextChunk(sentences("gamma", 5), "third.pdf")
+    budget = 200
+
+    context = assemble_context([best, second, third], budget)
+    assert count_tokens(context) <= budget
+    sections = context.split("\n\n")
+    # The best chunk comes first and whole; the next is cut at a sentence boundary
+    assert sections[0] == f"[Source: best.pdf]\n{best.text}"
+    assert sections[1].startswith("[Source: second.pdf]\nbeta rule 0 ")
+    assert sections[1].endswith(".") and len(sections[1]) < len(second.text)
+    # Too little room was left to start the third
+    assert budget - count_tokens(context) < MIN_PARTIAL_CHUNK_TOKENS + count_tokens("[Source: third.pdf]")
+    assert "third.pdf" not in context
+
+def test_repeated_sentences_are_included_once():
+    shared = sentences("shared", 3)
+    context = assemble_context(
+        [ContextChunk(shared, "a.pdf"), ContextChunk(shared, "b.pdf"), ContextChunk(sentences("other", 2), "c.pdf")],
+        500,
+    )
+    assert context.count("shared rule 0") == 1
+    assert "b.pdf" not in context and "c.pdf" in context
+
+def test_oversized_chunk_is_skipped_for_one_that_fits():
+    huge = ContextChunk(" ".join(["word"] * 300) + ".", "huge.pdf")
+    small = ContextChunk(sentences("small", 2), "small.pdf")
+    context = assemble_context([huge, small], 100)
+    assert context == f"[Source: small.pdf]\n{small.text}"
+
+def test_single_chunk_larger_than_the_budget_is_cut_at_a_word():
+    huge = ContextChunk(" ".join(f"word{i}" for i in range(500)), "huge.pdf")
+    context = assemble_context([huge], 100)
+    assert context.startswith("[Source: huge.pdf]\nword0 word1 ")
+    assert 0 < count_tokens(context) <= 100
+    # Whole words only
+    assert huge.text.startswith(context.split("\n", 1)[1] + " ")
+
+if __name__ == "__main__":
+    test_empty_context()
+    test_ranked_chunks_are_trimmed_at_the_budget()
+    test_repeated_sentences_are_included_once()
+    test_oversized_chunk_is_skipped_for_one_that_fits()
+    test_single_chunk_larger_than_the_budget_is_cut_at_a_word()
+    print("ok")
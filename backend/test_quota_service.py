@@ -0,0 +1,90 @@
+import asyncio
+import os
+import sys
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services import quota_service
+from app.services.quota_service import PRIORITY_BATCH, PRIORITY_INGEST, PRIORITY_INTERACTIVE, QuotaScheduler, bind_event_loop
+
+class SlowTakeScheduler(QuotaScheduler):
+    """Budget is always available, but taking it takes the given time per call, in order."""
+
+    def __init__(self, delays):
+        super().__init__("test", max_concurrency=4)
+        self.delays = list(delays)
+
+    async def _take(self, tokens: int) -> float:
+        await asyncio.sleep(self.delays.pop(0) if self.delays else 0)
+        return 0.0
+
+def test_priorities_interleaved_across_take():
+    async def scenario():
+        scheduler = SlowTakeScheduler([0.05, 1.0])
+
+        async def call(priority: int):
+            return await scheduler.admit(lambda: asyncio.sleep(0, result=priority), priority=priority)
+
+        # The batch caller is at the head and inside _take when the interactive one queues ahead
+        batch = asyncio.create_task(call(PRIORITY_BATCH))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.create_task(call(PRIORITY_INTERACTIVE))
+        assert await asyncio.wait_for(batch, 2) == PRIORITY_BATCH
+
+        # The interactive caller gives up while still taking budget; only its own entry goes
+        interactive.cancel()
+        try:
+            await interactive
+            raise AssertionError("the interactive call should have been cancelled")
+        except asyncio.CancelledError:
+            pass
+
+        # Nothing is left queued, so later batch calls are admitted at once
+        assert scheduler.snapshot()["waiting"] == 0
+        assert await asyncio.wait_for(call(PRIORITY_BATCH), 2) == PRIORITY_BATCH
+
+    asyncio.run(scenario())
+
+def test_ingestion_thread_queues_on_the_server_loop():
+    async def scenario():
+        bind_event_loop()
+        server_loop = asyncio.get_running_loop()
+        scheduler = QuotaScheduler("test", max_concurrency=1)
+        ran = []
+
+        def record(name: str):
+            async def fn():
+                ran.append((name, asyncio.get_running_loop() is server_loop))
+            return fn
+
+        # An interactive call holds the only slot while ingestion, on its own loop in a worker thread, queues
+        release = asyncio.Event()
+        holder = asyncio.create_task(scheduler.admit(release.wait, priority=PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.01)
+        ingest = server_loop.run_in_executor(
+            None, lambda: asyncio.run(scheduler.admit(record("ingest"), priority=PRIORITY_INGEST))
+        )
+        for _ in range(100):
+            if scheduler.snapshot()["waiting"]:
+                break
+            await asyncio.sleep(0.01)
+
+        # A later interactive call still goes first: both wait in the server loop's queue
+        interactive = asyncio.create_task(scheduler.admit(record("interactive"), priority=PRIORITY_INTERACTIVE))
+        await asyncio.sleep(0.01)
+        assert scheduler.snapshot()["waiting"] == 2
+        release.set()
+        await asyncio.wait_for(asyncio.gather(holder, interactive, ingest), 2)
+        assert ran == [("interactive", True), ("ingest", True)]
+        assert len(scheduler._loops) == 1
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        quota_service._shared_loop = None
+
+if __name__ == "__main__":
+    test_priorities_interleaved_across_take()
+    test_ingestion_thread_queues_on_the_server_loop()
+    print("ok")
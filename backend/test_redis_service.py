@@ -0,0 +1,135 @@
+import asyncio
+import json
+import os
+import sys
+import time
+import zlib
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.config import settings
+from app.services.redis_service import LocalCache, RedisService, decode_value, encode_value
+
+class FakeBinaryClient:
+    """The few binary-client calls the cache makes, backed by a dict; can be made to fail."""
+
+    def __init__(self):
+        self.data = {}
+        self.failing = False
+        self.calls = 0
+
+    def _call(self):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("Redis is down")
+
+    async def get(self, key):
+        self._call()
+        return self.data.get(key)
+
+    async def mget(self, keys):
+        self._call()
+        return [self.data.get(key) for key in keys]
+
+    async def setex(self, key, ttl, value):
+        self._call()
+        self.data[key] = value
+
+def make_service():
+    service = RedisService()
+    service._client = object()
+    service._binary_client = FakeBinaryClient()
+    return service
+
+def test_value_formats():
+    value = {"platform": "tiktok", "risk_level": "Low", "issues": []}
+    encoded = encode_value(value)
+    assert encoded.startswith(b"z1:")
+    assert zlib.decompress(encoded[3:]) == json.dumps(value, separators=(",", ":")).encode()
+    assert decode_value(encoded) == value
+    # Values written before compression are plain JSON
+    assert decode_value(json.dumps(value).encode()) == value
+
+def test_local_cache_evicts_least_recently_used():
+    cache = LocalCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c"), len(cache)) == (1, 3, 2)
+
+def test_local_cache_expires_entries():
+    cache = LocalCache(max_entries=2, ttl=60)
+    cache.set("a", 1, ttl=0.01)
+    time.sleep(0.02)
+    assert cache.get("a") is None and len(cache) == 0
+    assert len(LocalCache(max_entries=0, ttl=60)) == 0
+
+def test_corrupt_values_are_misses():
+    async def scenario():
+        service = make_service()
+        client = service._binary_client
+        client.data["analyze:bad"] = b"z1:not zlib"
+        client.data["analyze:foreign"] = b"\xff\xfe"
+        client.data["fp:media:good"] = encode_value([1, 2])
+        assert await service.get_cached_analysis("analyze:bad") is None
+        assert await service.get_cached_analysis("analyze:foreign") is None
+        assert service.stats["redis"] == {"hits": 0, "misses": 2}
+        assert await service.get_values(["fp:media:good", "analyze:bad", "missing"]) == [[1, 2], None, None]
+        # A corrupt value is not a Redis failure
+        assert service._failures == 0 and service.client is not None
+
+    asyncio.run(scenario())
+
+def test_reads_go_through_the_local_tier():
+    async def scenario():
+        service = make_service()
+        await service.set_cached_analysis("analyze:x", {"risk_level": "Low"})
+        service.local = LocalCache(max_entries=8, ttl=60)
+        assert await service.get_cached_analysis("analyze:x") == {"risk_level": "Low"}
+        calls = service._binary_client.calls
+        assert await service.get_cached_analysis("analyze:x") == {"risk_level": "Low"}
+        assert service._binary_client.calls == calls
+        assert service.stats["local"]["hits"] == 1 and service.stats["redis"]["hits"] == 1
+
+    asyncio.run(scenario())
+
+def test_circuit_breaker_opens_half_opens_and_closes():
+    async def scenario():
+        service = make_service()
+        client = service._binary_client
+        client.failing = True
+        for _ in range(settings.CACHE_BREAKER_FAILURES):
+            assert await service.get_cached_analysis("analyze:x") is None
+        # Open: Redis is skipped entirely
+        calls = client.calls
+        assert service.client is None
+        assert await service.get_cached_analysis("analyze:x") is None
+        assert client.calls == calls
+        assert service.cache_stats()["redis_breaker"] == "open"
+
+        # Half-open: after the reset period one call is let through; failing again re-opens at once
+        service._open_until = time.monotonic() - 1
+        assert await service.get_cached_analysis("analyze:x") is None
+        assert client.calls == calls + 1
+        assert service.client is None
+
+        # Closed again after a success
+        service._open_until = time.monotonic() - 1
+        client.failing = False
+        await service.set_cached_analysis("analyze:x", {"risk_level": "Low"})
+        assert service._failures == 0 and service.client is not None
+        assert service.cache_stats()["redis_breaker"] == "closed"
+
+    asyncio.run(scenario())
+
+if __name__ == "__main__":
+    test_value_formats()
+    test_local_cache_evicts_least_recently_used()
+    test_local_cache_expires_entries()
+    test_corrupt_values_are_misses()
+    test_reads_go_through_the_local_tier()
+    test_circuit_breaker_opens_half_opens_and_closes()
+    print("ok")
@@ -0,0 +1,65 @@
+import os
+import sys
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.models.schemas import AnalyzeResponse, Issue
+from app.services.analysis_service import Segment, merge_segment_results, shift_timestamp
+
+def segment(start: float, end=None) -> Segment:
+    return Segment(start, end, None)
+
+def issue(category: str, timestamp, snippet: str = "s") -> Issue:
+    return Issue(category=category, timestamp=timestamp, snippet=snippet, rationale="r")
+
+def result(risk_level: str, issues, summary: str = None) -> AnalyzeResponse:
+    return AnalyzeResponse(platform="tiktok", risk_level=risk_level, summary_rationale=summary, issues=issues)
+
+def test_shift_timestamp():
+    later = segment(175, 355)
+    assert shift_timestamp("00:12", segment(0, 180)) == "00:12"
+    assert shift_timestamp("00:12", later) == "03:07"
+    assert shift_timestamp("01:00-01:30", later) == "03:55-04:25"
+    assert shift_timestamp("00:10", segment(3595, 3775)) == "1:00:05"
+    assert shift_timestamp("1:00:00", later) == "1:02:55"
+
+def test_shift_timestamp_without_time_covers_the_segment():
+    assert shift_timestamp("Entire Video", segment(175, 355)) == "02:55-05:55"
+    assert shift_timestamp(None, segment(350)) == "05:50-end"
+
+def test_merge_takes_the_highest_risk_and_its_summaries():
+    merged = merge_segment_results("tiktok", [
+        (segment(175, 355), result("High", [], "weapon shown")),
+        (segment(0, 180), result("Low", [], "nothing")),
+        (segment(350), result("high", [], "more")),
+    ])
+    assert merged.platform == "tiktok"
+    assert merged.risk_level == "High"
+    assert merged.summary_rationale == "[02:55] weapon shown"
+
+def test_merge_drops_issues_seen_twice_in_the_overlap():
+    merged = merge_segment_results("tiktok", [
+        (segment(0, 180), result("High", [issue("Violence", "02:58"), issue("Drugs", "01:00")])),
+        # Same fight seen at the start of the next segment (175 + 4 = 02:59), within the overlap
+        (segment(175, 355), result("High", [issue("violence", "00:04"), issue("Violence", "02:00")])),
+    ])
+    assert [(i.category, i.timestamp) for i in merged.issues] == [
+        ("Violence", "02:58"), ("Drugs", "01:00"), ("Violence", "04:55"),
+    ]
+
+def test_merge_keeps_untimed_issues_by_snippet():
+    merged = merge_segment_results("tiktok", [
+        (segment(0, 180), result("Medium", [issue("Hate Speech", "Entire Video", "slur")])),
+        (segment(175, 355), result("Medium", [issue("Hate Speech", "Entire Video", "slur")])),
+    ])
+    # Untimed issues become the segment's span, so both segments keep theirs
+    assert [i.timestamp for i in merged.issues] == ["00:00-03:00", "02:55-05:55"]
+
+if __name__ == "__main__":
+    test_shift_timestamp()
+    test_shift_timestamp_without_time_covers_the_segment()
+    test_merge_takes_the_highest_risk_and_its_summaries()
+    test_merge_drops_issues_seen_twice_in_the_overlap()
+    test_merge_keeps_untimed_issues_by_snippet()
+    print("ok")
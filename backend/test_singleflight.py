@@ -0,0 +1,80 @@
+import asyncio
+import os
+import sys
+
+# Run from the repository root or from backend/
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.singleflight import SingleFlight
+
+def test_leader_cancellation_does_not_cancel_followers():
+    async def scenario():
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.1)
+            return "done"
+
+        leader = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0.01)
+
+        # The leader's client goes away; the follower still gets the shared result
+        leader.cancel()
+        try:
+            await leader
+            raise AssertionError("the leader should have been cancelled")
+        except asyncio.CancelledError:
+            pass
+        assert await asyncio.wait_for(follower, 2) == "done"
+        assert len(calls) == 1
+        assert not flight._inflight
+
+    asyncio.run(scenario())
+
+def test_work_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        callers = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        assert not flight._inflight
+
+        # A later caller starts the work afresh
+        assert await flight.do("key", lambda: asyncio.sleep(0, result="again")) == "again"
+
+    asyncio.run(scenario())
+
+def test_failure_is_shared():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            raise ValueError("boom")
+
+        outcomes = await asyncio.gather(*(flight.do("key", work) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(outcome, ValueError) for outcome in outcomes)
+
+    asyncio.run(scenario())
+
+if __name__ == "__main__":
+    test_leader_cancellation_does_not_cancel_followers()
+    test_work_is_cancelled_when_every_caller_leaves()
+    test_failure_is_shared()
+    print("ok")
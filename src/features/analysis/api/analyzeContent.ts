@@ -1,14 +1,32 @@
-import { AnalyzeResponse } from "../types/analysis.types";
+import { AnalyzeResponse, PreflightResponse } from "../types/analysis.types";
 
-export const analyzeContent = async (formData: FormData): Promise<AnalyzeResponse> => {
+const getApiUrl = () => {
     let API_URL = import.meta.env.VITE_API_URL || 'http://localhost:8000';
 
     // Proactive Fix: Add https if protocol is missing (prevents relative path 404s on Vercel)
     if (API_URL && !API_URL.startsWith('http')) {
         API_URL = `https://${API_URL}`;
     }
+    return API_URL;
+};
 
-    const response = await fetch(`${API_URL}/analyze`, {
+export const preflightAnalysis = async (platform: string, sha256: string, size: number): Promise<PreflightResponse> => {
+    const response = await fetch(`${getApiUrl()}/analyze/preflight`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ platform, sha256, size })
+    });
+
+    if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        throw new Error(errorData.detail || `Preflight failed: ${response.statusText}`);
+    }
+
+    return response.json();
+};
+
+export const analyzeContent = async (formData: FormData): Promise<AnalyzeResponse> => {
+    const response = await fetch(`${getApiUrl()}/analyze`, {
         method: 'POST',
         body: formData
     });
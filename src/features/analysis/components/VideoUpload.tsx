@@ -2,9 +2,11 @@ import { useState, useRef, DragEvent } from "react";
 import { Upload, File, X } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { cn } from "@/lib/utils";
+import { hashFile } from "../utils/hashFile";
 
 interface VideoUploadProps {
-  onFileSelect: (file: File) => void;
+  // sha256 resolves once the file is hashed (null if it couldn't be), so hashing overlaps with platform review
+  onFileSelect: (file: File, sha256: Promise<string | null>) => void;
   selectedFile: File | null;
   onClearFile: () => void;
 }
@@ -31,14 +33,14 @@ export default function VideoUpload({ onFileSelect, selectedFile, onClearFile }:
     const videoFile = files.find(file => file.type.startsWith('video/'));
 
     if (videoFile) {
-      onFileSelect(videoFile);
+      onFileSelect(videoFile, hashFile(videoFile));
     }
   };
 
   const handleFileSelect = (e: React.ChangeEvent<HTMLInputElement>) => {
     const file = e.target.files?.[0];
     if (file && file.type.startsWith('video/')) {
-      onFileSelect(file);
+      onFileSelect(file, hashFile(file));
     }
   };
 
@@ -11,3 +11,10 @@ export interface AnalyzeResponse {
     summary_rationale?: string;
     issues: AnalyzedIssue[];
 }
+
+export interface PreflightResponse {
+    status: 'cached' | 'upload_required';
+    result?: AnalyzeResponse;
+    upload_token?: string;
+    expires_at?: number;
+}
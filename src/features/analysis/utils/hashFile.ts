@@ -0,0 +1,21 @@
+// WebCrypto has no incremental digest, so the whole file is read into memory.
+// Mobile browsers kill tabs holding a few hundred MB, so above this size we
+// skip hashing (and the preflight cache check) and just upload.
+const MAX_HASH_BYTES = 100 * 1024 * 1024;
+
+/** Returns the file's hex SHA-256, or null when it can't (or shouldn't) be hashed in the browser. */
+export const hashFile = async (file: File): Promise<string | null> => {
+    if (file.size > MAX_HASH_BYTES || !globalThis.crypto?.subtle) {
+        return null;
+    }
+
+    try {
+        const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+        return Array.from(new Uint8Array(digest))
+            .map((byte) => byte.toString(16).padStart(2, '0'))
+            .join('');
+    } catch (error) {
+        console.warn('Could not hash file, uploading without preflight:', error);
+        return null;
+    }
+};
@@ -1,9 +1,9 @@
-import { useState } from "react";
+import { useRef, useState } from "react";
 import Hero from "@/features/landing/components/Hero";
 import PlatformSelector from "@/features/analysis/components/PlatformSelector";
 import VideoUpload from "@/features/analysis/components/VideoUpload";
 import AnalysisResults from "@/features/analysis/components/AnalysisResults";
-import { analyzeContent } from "@/features/analysis/api/analyzeContent";
+import { analyzeContent, preflightAnalysis } from "@/features/analysis/api/analyzeContent";
 import { AnalyzeResponse } from "@/features/analysis/types/analysis.types";
 import { useToast } from "@/components/ui/use-toast";
 import { Loader2 } from "lucide-react";
@@ -13,19 +13,49 @@ export default function Index() {
   const [file, setFile] = useState<File | null>(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
   const [results, setResults] = useState<AnalyzeResponse | null>(null);
+  const fileHash = useRef<Promise<string | null>>(Promise.resolve(null));
   const { toast } = useToast();
 
+  const handleFileSelect = (selected: File, sha256: Promise<string | null>) => {
+    setFile(selected);
+    fileHash.current = sha256;
+  };
+
+  // Asks the API for a cached verdict before uploading; on any failure we simply upload
+  const runPreflight = async (selected: File, platform: string) => {
+    const sha256 = await fileHash.current;
+    if (!sha256) return { sha256: null, preflight: null };
+    try {
+      return { sha256, preflight: await preflightAnalysis(platform, sha256, selected.size) };
+    } catch (error) {
+      console.warn('Preflight failed, uploading:', error);
+      return { sha256, preflight: null };
+    }
+  };
+
   const handleAnalyze = async () => {
     if (!file || !selectedPlatform) return;
 
     setIsAnalyzing(true);
-    const formData = new FormData();
-    formData.append('file', file);
-    formData.append('platform', selectedPlatform);
 
     try {
-      console.log("Starting analysis via feature API...");
-      const data = await analyzeContent(formData);
+      const { sha256, preflight } = await runPreflight(file, selectedPlatform);
+      let data: AnalyzeResponse;
+
+      if (preflight?.status === 'cached' && preflight.result) {
+        console.log("Cached analysis found, skipping upload");
+        data = preflight.result;
+      } else {
+        // Fields go before the file so the server can read them before the upload body
+        const formData = new FormData();
+        formData.append('platform', selectedPlatform);
+        if (sha256) formData.append('sha256', sha256);
+        if (preflight?.upload_token) formData.append('upload_token', preflight.upload_token);
+        formData.append('file', file);
+
+        console.log("Starting analysis via feature API...");
+        data = await analyzeContent(formData);
+      }
 
       console.log("Analysis success:", data);
       setResults(data);
@@ -69,7 +99,7 @@ export default function Index() {
         {selectedPlatform && !results && (
           <section id="upload" className="animate-in fade-in slide-in-from-bottom-8 duration-500">
             <VideoUpload
-              onFileSelect={setFile}
+              onFileSelect={handleFileSelect}
               selectedFile={file}
               onClearFile={() => setFile(null)}
             />